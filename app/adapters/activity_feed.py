@@ -0,0 +1,61 @@
+import json
+import time
+from typing import Callable
+
+import structlog
+
+from app.adapters.redis import RedisAdapter
+from app.config.config import FeedConfig
+
+logger = structlog.stdlib.get_logger()
+
+
+class ActivityFeed:
+    """
+    Capped feeds of recent public events, kept in redis sorted sets scored by the event time.
+    Entries are stored denormalized, so reading a feed does not touch the database.
+    Reads return None when the feed is unavailable and the caller has to fall back to the database
+    """
+
+    def __init__(self, config: FeedConfig, redis: RedisAdapter):
+        self.config = config
+        self.redis = redis
+
+    async def push(self, key: str, entries: list[tuple[float, dict]]) -> None:
+        if not entries:
+            return
+
+        mapping = {json.dumps(entry, default=str, sort_keys=True): score for score, entry in entries}
+
+        try:
+            async with self.redis.redis.pipeline(transaction=True) as pipe:
+                await pipe.zadd(key, mapping).zremrangebyrank(key, 0, -self.config.FEED_SIZE - 1).execute()
+        except Exception as e:
+            logger.warning(f"Activity feed push failed: {e}. {key=}")
+
+    async def recent(self, key: str, limit: int, since: float | None = None) -> list[dict] | None:
+        try:
+            async with self.redis.redis.pipeline(transaction=False) as pipe:
+                exists, members = await (
+                    pipe.exists(key)
+                    .zrevrangebyscore(key, max=time.time(), min=since or "-inf", start=0, num=limit)
+                    .execute()
+                )
+        except Exception as e:
+            logger.warning(f"Activity feed read failed: {e}. {key=}")
+            return None
+
+        if not exists:
+            return None
+
+        return [json.loads(member) for member in members]
+
+    async def discard(self, key: str, predicate: Callable[[dict], bool]) -> None:
+        try:
+            members = await self.redis.redis.zrange(key, 0, -1)
+            stale = [member for member in members if predicate(json.loads(member))]
+
+            if stale:
+                await self.redis.redis.zrem(key, *stale)
+        except Exception as e:
+            logger.warning(f"Activity feed discard failed: {e}. {key=}")
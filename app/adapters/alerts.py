@@ -1,22 +1,36 @@
+import asyncio
+import html
 import json
 import re
+import time
 import traceback
 import urllib.parse
 
-import aiohttp
 import structlog
-from starlette import status
+from prometheus_client import Counter
 from starlette.responses import Response
 
 from app.config.config import Config
-from app.config.constants import LOGGING_SENSITIVE_FIELDS, LOGGING_SENSITIVE_REPLACEMENT
+from app.config.constants import (
+    LOGGING_SENSITIVE_FIELDS,
+    LOGGING_SENSITIVE_REPLACEMENT,
+    TELEGRAM_MESSAGE_LIMIT,
+)
+from app.external.base.aiohttp_client import AioHttpClient, AioHttpPool
 from app.utils import struct_log
 
 logger = structlog.stdlib.get_logger()
 
+ALERTS_DROPPED = Counter("alerts_dropped_total", "Alerts dropped because the alerts queue was full")
+ALERTS_SUPPRESSED = Counter("alerts_suppressed_total", "Alerts suppressed as duplicates within the dedup window")
+ALERTS_SENT = Counter("alerts_sent_total", "Alert digests delivered to telegram")
+
+HTML_TAG = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^<>]*>")
+SPLIT_TAGS_RESERVE = 256  # room for the tags a split part closes and reopens
+
 
 class AlertsAdapter:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, pool: AioHttpPool):
         regex_str = r'("[^"]*?(?={keywords})[^"]*":\s*")[^"]*"'
         regex_with_keys = regex_str.format(keywords="|".join(LOGGING_SENSITIVE_FIELDS))
         self.regex_pattern = re.compile(regex_with_keys)
@@ -33,33 +47,66 @@ class AlertsAdapter:
         self._grafana_data_source = config.alerts.ALERTS_GRAFANA_DATA_SOURCE
         self._container_name = config.alerts.ALERTS_CONTAINER_NAME
 
-        self._bot_token = config.alerts.ALERTS_TELEGRAM_BOT_TOKEN
         self._chat_id = config.alerts.ALERTS_TELEGRAM_CHAT_ID
+        self._client = AioHttpClient(
+            auth_header={},
+            base_url=f"{config.alerts.ALERTS_TELEGRAM_BOT_API_URL}{config.alerts.ALERTS_TELEGRAM_BOT_TOKEN}",
+            pool=pool,
+        )
 
-    async def send_alert(self, message: str, chat_id: int = None) -> None:
-        logger.info(f"Sending alert: {message=}")
-        async with aiohttp.ClientSession() as client:
-            resp = await client.post(
-                ssl=False,
-                url=f"https://api.telegram.org/bot{self._bot_token}/sendMessage",
-                json=dict(
-                    chat_id=chat_id or self._chat_id,
-                    text=message,
-                    parse_mode="HTML",
-                ),
-            )
+        self._dedup_window = config.alerts.ALERTS_DEDUP_WINDOW
+        self._flush_interval = config.alerts.ALERTS_FLUSH_INTERVAL
+        self._min_send_interval = config.alerts.ALERTS_MIN_SEND_INTERVAL
+        self._close_timeout = config.alerts.ALERTS_CLOSE_TIMEOUT
+
+        # None in the queue only wakes the sender up on close
+        self._queue: asyncio.Queue[tuple[int, str] | None] = asyncio.Queue(maxsize=config.alerts.ALERTS_QUEUE_SIZE)
+        self._sender: asyncio.Task | None = None
+        self._closing = False
+        self._seen: dict[str, float] = {}
+        self._dropped = 0
+        self._suppressed = 0
+        self._next_send_at = 0.0
 
-        if resp.status >= status.HTTP_400_BAD_REQUEST:
-            logger.error(f"Cannot send alerts notification: {await resp.text()=}, {message=}")
+    async def start(self) -> None:
+        self._ensure_sender()
 
-    async def handle_alert(
+    async def close(self) -> None:
+        """Lets the sender deliver what it holds and what is queued, cancels it after ALERTS_CLOSE_TIMEOUT"""
+
+        self._closing = True
+
+        if self._sender is not None and not self._sender.done():
+            try:
+                self._queue.put_nowait(None)
+            except asyncio.QueueFull:
+                # the sender is not waiting on an empty queue, it sees the flag after the current batch
+                pass
+
+            try:
+                await asyncio.wait_for(self._sender, timeout=self._close_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Alerts sender did not finish in {self._close_timeout}s, undelivered alerts dropped")
+            except Exception as e:
+                logger.error(event=f"Alerts sender failed on close: {e}", exception=traceback.format_exception(e))
+
+        self._sender = None
+
+        batch = self._drain()
+        if batch:
+            await self._send_batch(batch=batch)
+
+    async def send_alert(self, message: str, chat_id: int = None) -> None:
+        self._enqueue(message=message, chat_id=chat_id or self._chat_id)
+
+    def handle_alert(
         self,
-        response: Response,
+        response: Response | None,
         total_time: float,
         exception: Exception | None = None,
     ) -> None:
         try:
-            await self._handle_alert(
+            self._handle_alert(
                 response=response,
                 total_time=total_time,
                 exception=exception,
@@ -70,9 +117,9 @@ class AlertsAdapter:
                 exception=traceback.format_exception(ex),
             )
 
-    async def _handle_alert(
+    def _handle_alert(
         self,
-        response: Response,
+        response: Response | None,
         total_time: float,
         exception: Exception | None = None,
     ) -> None:
@@ -82,12 +129,231 @@ class AlertsAdapter:
         if not self._alerts_enabled:
             return
 
+        if self._is_duplicate(exception=exception):
+            self._suppressed += 1
+            ALERTS_SUPPRESSED.inc()
+            return
+
         message = self._get_alerts_message(
             response=response,
             total_time=total_time,
         )
 
-        await self.send_alert(message=message)
+        self._enqueue(message=message, chat_id=self._chat_id)
+
+    def _is_duplicate(self, exception: Exception) -> bool:
+        fingerprint = self._get_fingerprint(exception=exception)
+        now = time.monotonic()
+
+        if len(self._seen) > self._queue.maxsize:
+            self._seen = {key: seen_at for key, seen_at in self._seen.items() if now - seen_at < self._dedup_window}
+
+        seen_at = self._seen.get(fingerprint)
+        if seen_at is not None and now - seen_at < self._dedup_window:
+            return True
+
+        self._seen[fingerprint] = now
+        return False
+
+    @staticmethod
+    def _get_fingerprint(exception: Exception) -> str:
+        frames = traceback.extract_tb(exception.__traceback__)
+        origin = f"{frames[-1].filename}:{frames[-1].lineno}" if frames else ""
+        return f"{type(exception).__module__}.{type(exception).__qualname__}@{origin}"
+
+    def _enqueue(self, message: str, chat_id: int) -> None:
+        logger.info(f"Sending alert: {message=}")
+
+        try:
+            self._queue.put_nowait((chat_id, message))
+        except asyncio.QueueFull:
+            self._dropped += 1
+            ALERTS_DROPPED.inc()
+            return
+
+        self._ensure_sender()
+
+    def _ensure_sender(self) -> None:
+        if self._sender is not None and not self._sender.done():
+            return
+
+        try:
+            self._sender = asyncio.get_running_loop().create_task(self._send_forever())
+        except RuntimeError:
+            # no running loop (e.g. import time), the first alert sent from a loop starts it
+            self._sender = None
+
+    async def _send_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while not (self._closing and self._queue.empty()):
+            batch = {}
+            item = await self._queue.get()
+            deadline = loop.time() + self._flush_interval
+
+            while item is not None:
+                chat_id, message = item
+                batch.setdefault(chat_id, []).append(message)
+
+                # on close the batch takes what is queued without waiting for more
+                item = await self._next(timeout=0 if self._closing else deadline - loop.time())
+
+            if not batch:
+                continue
+
+            try:
+                await self._send_batch(batch=batch)
+            except Exception as e:
+                logger.error(event=f"Unable to send alerts: {e}", exception=traceback.format_exception(e))
+
+    async def _next(self, timeout: float) -> tuple[int, str] | None:
+        try:
+            if timeout <= 0:
+                return self._queue.get_nowait()
+
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except (asyncio.QueueEmpty, asyncio.TimeoutError):
+            return None
+
+    def _drain(self) -> dict[int, list[str]]:
+        batch = {}
+
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                chat_id, message = item
+                batch.setdefault(chat_id, []).append(message)
+
+        return batch
+
+    async def _send_batch(self, batch: dict[int, list[str]]) -> None:
+        footer = ""
+        if self._dropped or self._suppressed:
+            footer = f"<i>Suppressed duplicates: {self._suppressed}, dropped (queue full): {self._dropped}</i>"
+            self._dropped = 0
+            self._suppressed = 0
+
+        for chat_id, messages in batch.items():
+            if chat_id == self._chat_id and footer:
+                messages.append(footer)
+                footer = ""
+
+            for digest in self._build_digests(messages=messages):
+                await self._deliver(chat_id=chat_id, text=digest)
+
+        if footer:
+            await self._deliver(chat_id=self._chat_id, text=footer)
+
+    @staticmethod
+    def _build_digests(messages: list[str]) -> list[str]:
+        separator = "\n\n➖➖➖➖➖\n\n"
+        digests = []
+        current = ""
+
+        # request alerts are cut to fit in _get_alerts_message, longer free-form send_alert texts are split
+        parts = (part for message in messages for part in AlertsAdapter._split(message=message))
+
+        for part in parts:
+            if current and len(current) + len(separator) + len(part) > TELEGRAM_MESSAGE_LIMIT:
+                digests.append(current)
+                current = ""
+
+            current = f"{current}{separator}{part}" if current else part
+
+        if current:
+            digests.append(current)
+
+        return digests
+
+    @staticmethod
+    def _split(message: str) -> list[str]:
+        """
+        Splits a message over the limit on line boundaries, every part is valid HTML on its own:
+        tags open at the end of a part are closed there and opened again at the start of the next one.
+        A line that does not fit in a part at all is escaped to plain text and cut
+        """
+
+        if len(message) <= TELEGRAM_MESSAGE_LIMIT:
+            return [message]
+
+        limit = TELEGRAM_MESSAGE_LIMIT - SPLIT_TAGS_RESERVE
+        parts = []
+        opened: list[tuple[str, str]] = []
+        prefix = current = ""
+
+        def flush() -> None:
+            nonlocal prefix, current
+            if current != prefix:
+                parts.append(current + "".join(f"</{name}>" for name, _ in reversed(opened)))
+                prefix = current = "".join(tag for _, tag in opened)
+
+        for line in message.splitlines(keepends=True):
+            if len(line) <= limit:
+                if len(current) + len(line) > limit:
+                    flush()
+
+                current += line
+
+                for match in HTML_TAG.finditer(line):
+                    name = match.group(2).lower()
+                    if not match.group(1):
+                        opened.append((name, match.group(0)))
+                    elif opened and opened[-1][0] == name:
+                        opened.pop()
+
+                continue
+
+            # too long to keep its markup: its tags are shown as text and do not change what is open
+            escaped = html.escape(line, quote=False)
+            while escaped:
+                flush()
+
+                chunk = escaped[:limit - len(current)]
+                amp = chunk.rfind("&")
+                if len(chunk) < len(escaped) and amp > 0 and ";" not in chunk[amp:]:
+                    chunk = chunk[:amp]
+
+                current += chunk
+                escaped = escaped[len(chunk):]
+
+        if current != prefix:
+            parts.append(current)
+
+        return parts
+
+    async def _deliver(self, chat_id: int, text: str) -> None:
+        loop = asyncio.get_running_loop()
+
+        for _ in range(3):
+            if (delay := self._next_send_at - loop.time()) > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                resp = await self._client.request(
+                    method="POST",
+                    url="/sendMessage",
+                    json=dict(chat_id=chat_id, text=text, parse_mode="HTML"),
+                    raise_exceptions=False,
+                    log=False,
+                )
+            except Exception as e:
+                logger.error(event=f"Cannot send alerts notification: {e}", exception=traceback.format_exception(e))
+                return
+            finally:
+                self._next_send_at = loop.time() + self._min_send_interval
+
+            if resp.get("ok"):
+                ALERTS_SENT.inc()
+                return
+
+            retry_after = (resp.get("parameters") or {}).get("retry_after")
+            if not retry_after:
+                logger.error(f"Cannot send alerts notification: {resp=}, {text=}")
+                return
+
+            self._next_send_at = loop.time() + retry_after
+
+        logger.error(f"Cannot send alerts notification, retries exhausted: {text=}")
 
     def _get_alerts_message(
         self,
@@ -112,8 +378,62 @@ class AlertsAdapter:
         else:
             response = ""
 
+        # values go into HTML, escaped so a < in a body does not break the parse of the whole digest
+        fields = dict(
+            method=method,
+            url=url,
+            query=query,
+            body=body,
+            user_id=user_id,
+            key=key,
+            response=response,
+        )
+        fields = {name: html.escape(str(value), quote=False) for name, value in fields.items()}
         grafana_url = self._get_grafana_url(key=key)
 
+        # query, body and response are unbounded, they share what the rest of the message leaves of the limit
+        unbounded = ("query", "body", "response")
+        fixed = len(
+            self._render_alert(
+                **{**fields, **{name: "" for name in unbounded}},
+                total_time=total_time,
+                grafana_url=grafana_url,
+            )
+        )
+        budget = max((TELEGRAM_MESSAGE_LIMIT - fixed) // len(unbounded), 0)
+
+        for name in unbounded:
+            fields[name] = self._cut(value=fields[name], limit=budget)
+
+        return self._render_alert(**fields, total_time=total_time, grafana_url=grafana_url)
+
+    @staticmethod
+    def _cut(value: str, limit: int) -> str:
+        if len(value) <= limit:
+            return value
+
+        value = value[:max(limit - 1, 0)]
+
+        # an escaped entity must not be left half cut
+        amp = value.rfind("&")
+        if amp != -1 and ";" not in value[amp:]:
+            value = value[:amp]
+
+        return f"{value}…"
+
+    def _render_alert(
+        self,
+        *,
+        method: str,
+        url: str,
+        query: str,
+        body: str,
+        user_id: str,
+        key: str,
+        total_time: float,
+        response: str,
+        grafana_url: str,
+    ) -> str:
         error = f"🛑 5️⃣0️⃣0️⃣ Ошибка {self._container_name} 🛑"
 
         result = ""
@@ -1,9 +1,22 @@
+import hashlib
+import hmac
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import FastAPI
+
+from app.adapters.activity_feed import ActivityFeed
 from app.adapters.alerts import AlertsAdapter
+from app.adapters.bets_config import BetsConfigCache
+from app.adapters.presence import Presence
 from app.adapters.redis import RedisAdapter
+from app.adapters.response_cache import ResponseCache
+from app.adapters.user_snapshots import UserSnapshots
 from app.config.config import Config
-from app.external.base.aiohttp_client import AioHttpClient
+from app.external.base.aiohttp_client import AioHttpClient, AioHttpPool
 from app.external.telegram_client import TelegramClient
 from app.telegram.patches import Bot
+from app.utils import TTLCache
 from i18n.service import I18n
 
 
@@ -11,9 +24,43 @@ class Adapters:
     def __init__(self, config: Config):
         self.config = config
         self.i18n = I18n()
-        self.alerts = AlertsAdapter(config=config)
-        self.http_client = AioHttpClient(auth_header={}, base_url="")
+        self.http_pool = AioHttpPool(config=config.http)
+        self.alerts = AlertsAdapter(config=config, pool=self.http_pool)
+        self.http_client = AioHttpClient(auth_header={}, base_url="", pool=self.http_pool)
 
         self.redis = RedisAdapter(config=config.redis)
+        self.bets_config = BetsConfigCache(config=config.cache, redis=self.redis)
+        self.response_cache = ResponseCache(config=config.cache, redis=self.redis)
+        self.activity_feed = ActivityFeed(config=config.feed, redis=self.redis)
+        self.user_snapshots = UserSnapshots(config=config.cache, redis=self.redis)
+        self.presence = Presence(redis=self.redis)
         self.bot = Bot(config=config.bot, i18n=self.i18n, token=config.bot.TELEGRAM_BOT_TOKEN)
-        self.telegram = TelegramClient(config=config)
+        self.telegram = TelegramClient(config=config, pool=self.http_pool)
+
+        self.webapp_secret_key = hmac.new(
+            key=b"WebAppData",
+            msg=config.bot.TELEGRAM_BOT_TOKEN.encode(),
+            digestmod=hashlib.sha256,
+        ).digest()
+        self.webapp_cache = TTLCache(
+            maxsize=config.auth.AUTH_WEBAPP_CACHE_SIZE,
+            ttl=config.auth.AUTH_WEBAPP_CACHE_TTL,
+        )
+
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI) -> AsyncIterator[None]:
+        async with self.background(), self.bot.setup(app=app):
+            yield
+
+    @asynccontextmanager
+    async def background(self) -> AsyncIterator[None]:
+        """Adapters without the web app parts, for processes like the scheduler"""
+
+        await self.http_pool.start()
+        await self.alerts.start()
+
+        try:
+            yield
+        finally:
+            await self.alerts.close()
+            await self.http_pool.close()
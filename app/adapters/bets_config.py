@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Sequence
+
+import structlog
+
+from app.adapters.redis import RedisAdapter
+from app.config.config import CacheConfig
+from app.config.constants import BETS_CONFIG_VERSION_KEY
+from app.db.models import BetConfig
+from app.sampler import Sampler
+
+logger = structlog.stdlib.get_logger()
+
+
+class BetsTable:
+    def __init__(self, configs: Sequence[BetConfig]):
+        self.configs = list(configs)
+        self.sampler = Sampler(
+            population=self.configs,
+            weights=[float(config.actual_probability) for config in self.configs],
+        )
+
+    def choose(self) -> BetConfig:
+        return self.sampler.choose()
+
+
+class BetsConfigCache:
+    """
+    Per-worker copy of bets_config, grouped by bet_from with precomputed weights.
+    Reloaded when the version in redis changes, the version is checked at most every CACHE_VERSION_CHECK_INTERVAL
+    """
+
+    def __init__(self, config: CacheConfig, redis: RedisAdapter):
+        self.config = config
+        self.redis = redis
+
+        self._tables: dict[float, BetsTable] | None = None
+        self._version: str | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, loader: Callable[[], Awaitable[Sequence[BetConfig]]]) -> dict[float, BetsTable]:
+        if self._is_fresh():
+            return self._tables
+
+        async with self._lock:
+            if self._is_fresh():
+                return self._tables
+
+            version = await self.redis.get(key=BETS_CONFIG_VERSION_KEY)
+            self._checked_at = time.monotonic()
+
+            if self._tables is None or version != self._version:
+                self._tables = self._build(configs=await loader())
+                self._version = version
+                logger.info(f"Bets config loaded, {version=}")
+
+        return self._tables
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._tables is not None
+            and time.monotonic() - self._checked_at < self.config.CACHE_VERSION_CHECK_INTERVAL
+        )
+
+    async def invalidate(self) -> None:
+        await self.redis.redis.incr(BETS_CONFIG_VERSION_KEY)
+        self._tables = None
+
+    @staticmethod
+    def _build(configs: Sequence[BetConfig]) -> dict[float, BetsTable]:
+        grouped = defaultdict(list)
+
+        for config in configs:
+            grouped[float(config.bet_from)].append(config)
+
+        tables = {}
+        for bet_from, items in grouped.items():
+            if not any(config.actual_probability for config in items):
+                logger.warning(f"Bets config for {bet_from=} has no positive probabilities, skipped")
+                continue
+
+            tables[bet_from] = BetsTable(configs=items)
+
+        return tables
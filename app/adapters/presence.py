@@ -0,0 +1,100 @@
+import time
+from datetime import UTC, datetime
+
+import structlog
+from redis.exceptions import ResponseError
+
+from app.adapters.redis import RedisAdapter
+from app.config.constants import (
+    ACTIVE_USERS_KEY,
+    ACTIVE_USERS_SEEDED_KEY,
+    ACTIVE_USERS_WINDOW,
+    PRESENCE_FLUSHING_KEY,
+    PRESENCE_KEY,
+)
+
+logger = structlog.stdlib.get_logger()
+
+
+class Presence:
+    """
+    Last seen times of users, kept in two redis sorted sets scored by the time:
+    heartbeats not yet written to users.last_online (flushed in bulk by TaskService.flush_presence),
+    and users active in the last ACTIVE_USERS_WINDOW, which the eligibility scans read instead of the users table
+    """
+
+    def __init__(self, redis: RedisAdapter):
+        self.redis = redis
+
+    async def touch(self, telegram_id: int) -> None:
+        mapping = {telegram_id: time.time()}
+
+        try:
+            async with self.redis.redis.pipeline(transaction=False) as pipe:
+                await pipe.zadd(PRESENCE_KEY, mapping, gt=True).zadd(ACTIVE_USERS_KEY, mapping, gt=True).execute()
+        except Exception as e:
+            logger.warning(f"Presence heartbeat failed: {e}. {telegram_id=}")
+
+    async def pending(self, count: int) -> list[tuple[int, datetime]]:
+        """
+        Heartbeats to write. They are moved aside first and stay there until acked,
+        so a flush that failed or was killed is picked up by the next one
+        """
+
+        redis = self.redis.redis
+
+        if not await redis.exists(PRESENCE_FLUSHING_KEY):
+            try:
+                await redis.rename(PRESENCE_KEY, PRESENCE_FLUSHING_KEY)
+            except ResponseError:
+                # no heartbeats since the last flush
+                return []
+
+        entries = await redis.zrange(PRESENCE_FLUSHING_KEY, 0, count - 1, withscores=True)
+        # users.last_online is a naive UTC timestamp
+        return [
+            (int(member), datetime.fromtimestamp(score, UTC).replace(tzinfo=None))
+            for member, score in entries
+        ]
+
+    async def ack(self, entries: list[tuple[int, datetime]]) -> None:
+        if entries:
+            await self.redis.redis.zrem(PRESENCE_FLUSHING_KEY, *(telegram_id for telegram_id, _ in entries))
+
+    async def active(self, since: float) -> list[int] | None:
+        """Users seen after ``since``, None when the set is not seeded yet or redis failed"""
+
+        try:
+            async with self.redis.redis.pipeline(transaction=False) as pipe:
+                seeded, members = await (
+                    pipe.exists(ACTIVE_USERS_SEEDED_KEY)
+                    .zrangebyscore(ACTIVE_USERS_KEY, min=since, max="+inf")
+                    .execute()
+                )
+        except Exception as e:
+            logger.warning(f"Active users read failed: {e}")
+            return None
+
+        if not seeded:
+            return None
+
+        return [int(member) for member in members]
+
+    async def is_seeded(self) -> bool:
+        return bool(await self.redis.redis.exists(ACTIVE_USERS_SEEDED_KEY))
+
+    async def seed(self, entries: list[tuple[int, datetime]]) -> None:
+        """Adds users seen according to the database, heartbeats newer than that win"""
+
+        if not entries:
+            return
+
+        epoch = datetime(1970, 1, 1)
+        mapping = {telegram_id: (seen_at - epoch).total_seconds() for telegram_id, seen_at in entries}
+        await self.redis.redis.zadd(ACTIVE_USERS_KEY, mapping, gt=True)
+
+    async def mark_seeded(self) -> None:
+        await self.redis.redis.set(ACTIVE_USERS_SEEDED_KEY, 1)
+
+    async def trim(self) -> None:
+        await self.redis.redis.zremrangebyscore(ACTIVE_USERS_KEY, "-inf", time.time() - ACTIVE_USERS_WINDOW)
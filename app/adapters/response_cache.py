@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import structlog
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.adapters.redis import RedisAdapter
+from app.config.config import CacheConfig
+from app.utils import TTLCache
+
+logger = structlog.stdlib.get_logger()
+
+REDIS_PREFIX = "response_cache:"
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    expires_at: float
+
+    @classmethod
+    def create(cls, body: bytes, ttl: float) -> "CachedResponse":
+        etag = f'"{hashlib.sha1(body, usedforsecurity=False).hexdigest()}"'
+        return cls(body=body, etag=etag, expires_at=time.monotonic() + ttl)
+
+    def to_response(self, request: Request) -> Response:
+        max_age = max(int(self.expires_at - time.monotonic()), 0)
+        headers = {"ETag": self.etag, "Cache-Control": f"public, max-age={max_age}"}
+
+        if request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """
+    Serialized bodies of public endpoints: a per-worker TTL cache in front of a shared copy in redis.
+    Concurrent misses of a key in a worker wait for one build (single flight)
+    """
+
+    def __init__(self, config: CacheConfig, redis: RedisAdapter):
+        self.config = config
+        self.redis = redis
+
+        self._local = TTLCache(maxsize=config.CACHE_RESPONSES_SIZE, ttl=config.CACHE_RESPONSES_TTL)
+        self._inflight: dict[str, asyncio.Future[CachedResponse]] = {}
+
+    async def get(self, key: str, ttl: float, build: Callable[[], Awaitable[bytes]]) -> CachedResponse:
+        cached = self._local.get(key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+
+                # the leader was cancelled (client gone, shutdown), one of the waiters builds instead
+                return await self.get(key=key, ttl=ttl, build=build)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        try:
+            cached = await self._load(key=key, ttl=ttl, build=build)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it, nobody else has to retrieve it
+            raise
+        else:
+            future.set_result(cached)
+            return cached
+        finally:
+            # cancellation skips both branches above, the waiters must not hang on an unresolved future
+            if not future.done():
+                future.cancel()
+
+            del self._inflight[key]
+
+    async def delete(self, key: str) -> None:
+        self._local.delete(key)
+        await self.redis.delete(key=REDIS_PREFIX + key)
+
+    async def _load(self, key: str, ttl: float, build: Callable[[], Awaitable[bytes]]) -> CachedResponse:
+        try:
+            async with self.redis.redis.pipeline(transaction=False) as pipe:
+                body, ttl_ms = await pipe.get(REDIS_PREFIX + key).pttl(REDIS_PREFIX + key).execute()
+        except Exception as e:
+            logger.warning(f"Response cache redis read failed: {e}. {key=}")
+            body, ttl_ms = None, 0
+
+        if body is not None and ttl_ms > 0:
+            cached = CachedResponse.create(body=body, ttl=ttl_ms / 1000)
+        else:
+            body = await build()
+            cached = CachedResponse.create(body=body, ttl=ttl)
+
+            try:
+                await self.redis.redis.set(name=REDIS_PREFIX + key, value=body, px=int(ttl * 1000))
+            except Exception as e:
+                logger.warning(f"Response cache redis write failed: {e}. {key=}")
+
+        self._local.set(key, cached, ttl=cached.expires_at - time.monotonic())
+        return cached
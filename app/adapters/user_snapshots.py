@@ -0,0 +1,142 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Type
+
+import structlog
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.adapters.redis import RedisAdapter
+from app.config.config import CacheConfig
+from app.config.constants import (
+    AFTER_COMMIT_INFO_KEY,
+    ALL_USERS_CHANGED_INFO_KEY,
+    CHANGED_USERS_INFO_KEY,
+    USER_SNAPSHOT_EPOCH_KEY,
+    USER_SNAPSHOT_KEY,
+    USER_VERSION_KEY,
+)
+from app.db.models import Base, Rocket, User
+
+logger = structlog.stdlib.get_logger()
+
+Version = tuple[str | None, str | None]
+
+
+def _dump(model: Base) -> dict[str, Any]:
+    return {attr.key: getattr(model, attr.key) for attr in inspect(type(model)).column_attrs}
+
+
+def _load(model: Type[Base], data: dict[str, Any]) -> Base:
+    values = {}
+    for attr in inspect(model).column_attrs:
+        value = data.get(attr.key)
+        python_type = attr.columns[0].type.python_type
+
+        if value is not None and python_type is datetime:
+            value = datetime.fromisoformat(value)
+        elif value is not None and python_type is Decimal:
+            value = Decimal(value)
+
+        values[attr.key] = value
+
+    return model(**values)
+
+
+class UserSnapshots:
+    """
+    Copies of users with their rockets for the endpoints that read the current user on every call.
+    A snapshot is tagged with the user version and the global epoch, both read before the database.
+    Repos mark the users they change and the commit bumps their versions (bulk jobs bump the epoch),
+    so a snapshot built from data older than the last commit never matches and is not served
+    """
+
+    def __init__(self, config: CacheConfig, redis: RedisAdapter):
+        self.config = config
+        self.redis = redis
+
+    def attach(self, session_factory: sessionmaker) -> None:
+        session_factory.configure(info={AFTER_COMMIT_INFO_KEY: [self._after_commit]})
+
+    async def get(self, telegram_id: int) -> tuple[User | None, Version | None]:
+        """The snapshot if it is current, and the version to store a fresh one with (None if redis failed)"""
+
+        keys = (
+            USER_SNAPSHOT_KEY.format(telegram_id=telegram_id),
+            USER_VERSION_KEY.format(telegram_id=telegram_id),
+            USER_SNAPSHOT_EPOCH_KEY,
+        )
+
+        try:
+            snapshot, *version = await self.redis.redis.mget(keys)
+        except Exception as e:
+            logger.warning(f"User snapshot read failed: {e}. {telegram_id=}")
+            return None, None
+
+        version = tuple(value.decode() if value else None for value in version)
+        if not snapshot:
+            return None, version
+
+        data = json.loads(snapshot)
+        if tuple(data["version"]) != version:
+            return None, version
+
+        user = _load(User, data["user"])
+        user.rockets = [_load(Rocket, rocket) for rocket in data["rockets"]]
+        return user, version
+
+    async def version(self, telegram_id: int) -> Version | None:
+        try:
+            version = await self.redis.redis.mget(
+                USER_VERSION_KEY.format(telegram_id=telegram_id),
+                USER_SNAPSHOT_EPOCH_KEY,
+            )
+        except Exception as e:
+            logger.warning(f"User version read failed: {e}. {telegram_id=}")
+            return None
+
+        return tuple(value.decode() if value else None for value in version)
+
+    async def set(self, user: User, version: Version | None) -> None:
+        if version is None:
+            return
+
+        data = dict(
+            version=version,
+            user=_dump(user),
+            rockets=[_dump(rocket) for rocket in user.rockets],
+        )
+
+        try:
+            await self.redis.redis.set(
+                USER_SNAPSHOT_KEY.format(telegram_id=user.telegram_id),
+                json.dumps(data, default=str),
+                ex=self.config.CACHE_USER_SNAPSHOT_TTL,
+            )
+        except Exception as e:
+            logger.warning(f"User snapshot write failed: {e}. {user.telegram_id=}")
+
+    async def invalidate(self, telegram_ids: Iterable[int], everyone: bool = False) -> None:
+        # version keys outlive snapshots, so a version never falls back to the one a live snapshot was tagged with
+        try:
+            async with self.redis.redis.pipeline(transaction=False) as pipe:
+                for telegram_id in telegram_ids:
+                    version_key = USER_VERSION_KEY.format(telegram_id=telegram_id)
+                    pipe.incr(version_key).expire(version_key, self.config.CACHE_USER_VERSION_TTL)
+                    pipe.delete(USER_SNAPSHOT_KEY.format(telegram_id=telegram_id))
+
+                if everyone:
+                    pipe.incr(USER_SNAPSHOT_EPOCH_KEY)
+
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"User snapshots invalidation failed: {e}. {everyone=}")
+
+    async def _after_commit(self, session: AsyncSession) -> None:
+        telegram_ids = session.info.pop(CHANGED_USERS_INFO_KEY, None)
+        everyone = session.info.pop(ALL_USERS_CHANGED_INFO_KEY, False)
+
+        if telegram_ids or everyone:
+            await self.invalidate(telegram_ids=telegram_ids or (), everyone=everyone)
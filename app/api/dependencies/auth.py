@@ -23,9 +23,15 @@ def get_country(request: Request) -> str | None:
 
 
 async def get_current_user(
+    request: Request = None,
     services: Services = Depends(dependency_services),
     webapp_data: str = Depends(AuthUserHeader),
 ) -> WebappData:
+    if request is not None:
+        verified = getattr(request.state, "webapp_data", None)
+        if verified is not None:
+            return verified
+
     return services.auth.auth_webapp(webapp_data=webapp_data, adapters=services.adapters)
 
 
@@ -1,6 +1,13 @@
+from fastapi import Query
+
 from app.init.base_models import BaseModel
 
 
 class UpdateUserRequest(BaseModel):
     address: str | None = None
     rich_ads_tasks: int | None = None
+
+
+class TransactionsRequest(BaseModel):
+    cursor: str | None = Query(default=None, description="nextCursor of the previous page, empty for the newest")
+    limit: int = Query(default=50, ge=1, le=100)
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from pydantic import ConfigDict, Field, computed_field
 from pydantic import field_validator
@@ -10,11 +10,74 @@ from app.config.constants import (
     REFERRAL_PREFIX,
     WEBAPP_NAME,
 )
-from app.db.models import RocketTypeEnum
+from app.db.models import (
+    CurrenciesEnum,
+    RocketTypeEnum,
+    TransactionStatusEnum,
+    TransactionTypeEnum,
+    User,
+)
 
 
 config = get_config()
 
+AVAILABLE_ROLLS = (0.5, 1.0, 2.0, 3.0, 4.0, 5.0, 10.0, 20.0, 50.0, 120.0, 250.0, 500.0, 700.0, 1000.0, 1200.0)
+AVAILABLE_ROLLS_KEYS = tuple((roll, str(roll)) for roll in AVAILABLE_ROLLS)
+REFERRAL_URL = f"https://t.me/{BOT_NAME}/{WEBAPP_NAME}?startapp={REFERRAL_PREFIX}"
+
+
+def _normalize_rolls(rolls: dict) -> dict[float, int]:
+    return {float(key): int(value) for key, value in rolls.items()}
+
+
+def _upcoming(at: datetime | None, now: datetime) -> datetime | None:
+    return at if at is not None and at > now else None
+
+
+def user_payload(user: User) -> dict:
+    """
+    The UserResponse JSON of a user, built straight from the ORM object for the endpoints that return just the user.
+    Validating the ORM object attribute by attribute and serializing the model was most of the cost of the payload.
+    Keys and values are the ones UserResponse dumps by alias, in the same order
+    """
+
+    now = datetime.utcnow()
+    rolls = _normalize_rolls(rolls=user.rolls)
+    rocket_types = {rocket.type for rocket in user.rockets}
+
+    def next_rocket_in(rocket_type: RocketTypeEnum, at: datetime) -> datetime | None:
+        return None if rocket_type in rocket_types else _upcoming(at=at, now=now)
+
+    return {
+        "id": user.id,
+        "telegramId": user.telegram_id,
+        "tonBalance": float(user.ton_balance),
+        "usdtBalance": float(user.usdt_balance),
+        "tokenBalance": float(user.token_balance),
+        "wheelBalance": float(user.wheel_balance),
+        "paymentAddress": config.scanner.SCANNER_WALLET,
+        "nextWheelAt": _upcoming(at=user.next_wheel_at, now=now),
+        "nextWheelAdAt": _upcoming(at=user.next_wheel_ad_at, now=now),
+        "richAdsTasks": user.rich_ads_tasks,
+        "rockets": [
+            {
+                "id": rocket.id,
+                "type": rocket.type,
+                "fuelCapacity": rocket.fuel_capacity,
+                "currentFuel": rocket.current_fuel,
+                "enabled": rocket.enabled,
+                "seen": rocket.seen,
+            }
+            for rocket in user.rockets
+        ],
+        "availableRolls": {key: rolls.get(roll, 0) for roll, key in AVAILABLE_ROLLS_KEYS},
+        "hasBoost": user.boost_balance > 0,
+        "referral": f"{REFERRAL_URL}{user.telegram_id}",
+        "nextDefaultRocketIn": next_rocket_in(rocket_type=RocketTypeEnum.default, at=user.next_default_rocket_at),
+        "nextOfflineRocketIn": next_rocket_in(rocket_type=RocketTypeEnum.offline, at=user.next_offline_rocket_at),
+        "nextPremiumRocketIn": next_rocket_in(rocket_type=RocketTypeEnum.premium, at=user.next_premium_rocket_at),
+    }
+
 
 class RocketResponse(BaseResponse):
     model_config = ConfigDict(populate_by_name=True, from_attributes=True)
@@ -48,17 +111,7 @@ class UserResponse(BaseResponse):
 
     @computed_field
     def available_rolls(self) -> dict:
-        rolls = [float(i) for i in [
-            0.5, 1, 2, 3, 4, 5, 10, 20, 50, 120, 250, 500, 700, 1000, 1200
-        ]]
-
-        old_rolls = {float(key): int(value) for key, value in self.rolls.items()}
-        new_rolls = {}
-
-        for roll in rolls:
-            new_rolls[roll] = old_rolls.get(roll, 0)
-
-        return new_rolls
+        return {roll: self.rolls.get(roll, 0) for roll in AVAILABLE_ROLLS}
 
     @computed_field
     def has_boost(self) -> bool:
@@ -66,7 +119,12 @@ class UserResponse(BaseResponse):
 
     @computed_field
     def referral(self) -> str:
-        return f"https://t.me/{BOT_NAME}/{WEBAPP_NAME}?startapp={REFERRAL_PREFIX}{self.telegram_id}"
+        return f"{REFERRAL_URL}{self.telegram_id}"
+
+    @field_validator("rolls", mode="after")
+    @classmethod
+    def validate_rolls(cls, v: dict) -> dict[float, int]:
+        return _normalize_rolls(rolls=v)
 
     @field_validator("next_wheel_at", "next_wheel_ad_at", mode="before")
     @classmethod
@@ -76,35 +134,23 @@ class UserResponse(BaseResponse):
 
         return v
 
-    @computed_field
-    def next_default_rocket_in(self) -> timedelta | None:
-        if RocketTypeEnum.default in [rocket.type for rocket in self.rockets]:
+    def _next_rocket_in(self, rocket_type: RocketTypeEnum, at: datetime) -> datetime | None:
+        if any(rocket.type == rocket_type for rocket in self.rockets):
             return None
 
-        if self.next_default_rocket_at <= datetime.utcnow():
-            return None
-
-        return self.next_default_rocket_at
+        return _upcoming(at=at, now=datetime.utcnow())
 
     @computed_field
-    def next_offline_rocket_in(self) -> timedelta | None:
-        if RocketTypeEnum.offline in [rocket.type for rocket in self.rockets]:
-            return None
-
-        if self.next_offline_rocket_at <= datetime.utcnow():
-            return None
-
-        return self.next_offline_rocket_at
+    def next_default_rocket_in(self) -> datetime | None:
+        return self._next_rocket_in(rocket_type=RocketTypeEnum.default, at=self.next_default_rocket_at)
 
     @computed_field
-    def next_premium_rocket_in(self) -> timedelta | None:
-        if RocketTypeEnum.premium in [rocket.type for rocket in self.rockets]:
-            return None
-
-        if self.next_premium_rocket_at <= datetime.utcnow():
-            return None
+    def next_offline_rocket_in(self) -> datetime | None:
+        return self._next_rocket_in(rocket_type=RocketTypeEnum.offline, at=self.next_offline_rocket_at)
 
-        return self.next_premium_rocket_at
+    @computed_field
+    def next_premium_rocket_in(self) -> datetime | None:
+        return self._next_rocket_in(rocket_type=RocketTypeEnum.premium, at=self.next_premium_rocket_at)
 
 
 class PublicUserResponse(BaseResponse):
@@ -125,3 +171,20 @@ class PublicUserResponse(BaseResponse):
             username = (self.tg_first_name or "") + (self.tg_last_name or "")
 
         return username
+
+
+class TransactionResponse(BaseResponse):
+    id: int
+    created_at: datetime
+    balance_before: float | None
+    balance_after: float | None
+    balance_amount: float | None
+    balance_currency: CurrenciesEnum
+    type: TransactionTypeEnum
+    status: TransactionStatusEnum
+    refund_id: int | None
+
+
+class TransactionsResponse(BaseResponse):
+    items: list[TransactionResponse]
+    next_cursor: str | None = Field(default=None, description="Курсор следующей страницы, None на последней")
@@ -1,5 +1,5 @@
-import asyncio
 import json
+import random
 import re
 import time
 import traceback
@@ -8,12 +8,12 @@ from json import JSONDecodeError
 from typing import Any, Dict
 
 import structlog
-from fastapi import FastAPI
 from opentelemetry import trace
 from starlette import status
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.requests import Request
-from starlette.responses import JSONResponse, Response
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.adapters.base import Adapters
 from app.config.constants import (
@@ -27,66 +27,101 @@ from app.services.dto.auth import WebappData
 logger = structlog.stdlib.get_logger()
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: FastAPI, adapters: Adapters):
-        BaseHTTPMiddleware.__init__(self, app=app, dispatch=self.dispatch)
+class LoggingMiddleware:
+    # Pure ASGI: the request body is only teed while the app reads it and gets decoded on the
+    # error path (or for LOGS_BODY_SAMPLE_RATE of requests); LOGGING_DISABLED_ENDPOINTS skip everything
+
+    def __init__(self, app: ASGIApp, adapters: Adapters):
+        self.app = app
         self.adapters = adapters
+        self.body_sample_rate = adapters.config.logs.LOGS_BODY_SAMPLE_RATE
 
         regex_str = r'("[^"]*?(?={keywords})[^"]*":\s*")[^"]*"'
         regex_with_keys = regex_str.format(keywords="|".join(LOGGING_SENSITIVE_FIELDS))
         self.regex_pattern = re.compile(regex_with_keys)
         self.substitution = rf'\1{LOGGING_SENSITIVE_REPLACEMENT}"'
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in LOGGING_DISABLED_ENDPOINTS:
+            await self.app(scope, receive, send)
+            return
+
         start = time.time()
-        request_dict = await self._get_request_dict(request=request)
+        request = Request(scope)
+        request_dict = self._get_request_dict(request=request)
+        key = request_dict["key"]
 
         structlog.contextvars.clear_contextvars()
         structlog.contextvars.bind_contextvars(**request_dict)
-        trace.get_current_span().set_attribute("logging.key", request_dict["key"])
+        trace.get_current_span().set_attribute("logging.key", key)
+
+        body_chunks: list[bytes] = []
+        capture_body = request.headers.get("Content-Type", "").startswith("application/json")
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        response_started = False
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if capture_body and message["type"] == "http.request":
+                body_chunks.append(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_started
+
+            if message["type"] == "http.response.start":
+                response_started = True
+                status_code = message["status"]
+                MutableHeaders(scope=message)["X-Error-Trace"] = key
+
+            await send(message)
 
         try:
-            exception = None
-            response = await call_next(request)
-            response.headers["X-Error-Trace"] = request_dict["key"]
-        except Exception as ex:
-            exception = ex
-            response = JSONResponse(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                content={"message": "Server Error. Please try again later"},
-            )
-            response.headers["X-Error-Trace"] = request_dict["key"]
-
-        total_time = time.time() - start
-        duration = f"{total_time:.3f}"
-        event = f"{response.status_code} | {duration} s"
-
-        if (exception is None) and (request.url.path not in LOGGING_DISABLED_ENDPOINTS):
-            logger.info(event=event, status_code=response.status_code, duration=duration)
-
-        if exception:
-            if self.adapters.config.logs.LOGS_IS_JSON:
-                formatted_exception = traceback.format_exception(exception)
-            else:
-                formatted_exception = str(traceback.format_exception(exception))
-
-            logger.error(
-                event="A server error has occurred",
-                exception=formatted_exception,
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                duration=duration,
-            )
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except Exception as exception:
+            structlog.contextvars.bind_contextvars(body=self._format_body(body=b"".join(body_chunks)))
+            response = None
 
-        traceback.print_exception(exception)
-        asyncio.create_task(
-            self.adapters.alerts.handle_alert(
-                response=response,
-                total_time=total_time,
-                exception=exception,
-            )
+            if not response_started:
+                response = JSONResponse(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    content={"message": "Server Error. Please try again later"},
+                    headers={"X-Error-Trace": key},
+                )
+                await response(scope, receive, send)
+
+            self._log_exception(exception=exception, response=response, total_time=time.time() - start)
+
+            if response_started:
+                raise exception
+
+            return
+
+        if capture_body and random.random() < self.body_sample_rate:  # noqa: S311
+            structlog.contextvars.bind_contextvars(body=self._format_body(body=b"".join(body_chunks)))
+
+        duration = f"{time.time() - start:.3f}"
+        logger.info(event=f"{status_code} | {duration} s", status_code=status_code, duration=duration)
+
+    def _log_exception(self, exception: Exception, response: JSONResponse | None, total_time: float) -> None:
+        if self.adapters.config.logs.LOGS_IS_JSON:
+            formatted_exception = traceback.format_exception(exception)
+        else:
+            formatted_exception = str(traceback.format_exception(exception))
+
+        logger.error(
+            event="A server error has occurred",
+            exception=formatted_exception,
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            duration=f"{total_time:.3f}",
         )
 
-        return response
+        traceback.print_exception(exception)
+        self.adapters.alerts.handle_alert(
+            response=response,
+            total_time=total_time,
+            exception=exception,
+        )
 
     def decode_auth_token(self, request: Request) -> WebappData | None:
         auth_token = request.headers.get("token", "")
@@ -94,24 +129,18 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             return
 
         try:
-            return AuthService.auth_webapp(webapp_data=auth_token, adapters=self.adapters)
+            auth_data = AuthService.auth_webapp(webapp_data=auth_token, adapters=self.adapters)
         except Exception:  # noqa
             return None
 
-    async def _get_request_dict(self, request: Request) -> Dict[str, Any]:
-        auth_data = self.decode_auth_token(request=request)
-        content_type = request.headers.get("Content-Type", "")
-        client_ip = request.headers.get("cf-connecting-ip") or request.headers.get("x-real-ip") or request.client.host
-        body = ""
-
-        if content_type.startswith("application/json"):
-            body = await request.body()
+        # shared with get_current_user, so the token is verified once per request
+        request.state.webapp_data = auth_data
+        return auth_data
 
-            try:
-                body = json.dumps(json.loads(body), ensure_ascii=False)
-                body = self._protect_body(body=body)
-            except JSONDecodeError:
-                pass
+    def _get_request_dict(self, request: Request) -> Dict[str, Any]:
+        auth_data = self.decode_auth_token(request=request)
+        headers: Headers = request.headers
+        client_ip = headers.get("cf-connecting-ip") or headers.get("x-real-ip") or request.client.host
 
         url = str(request.url)
         query = json.dumps(dict(request.query_params.items()), ensure_ascii=False)  # noqa
@@ -122,13 +151,22 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             "method": method,
             "url": url,
             "query": query,
-            "body": body,
+            "body": "",
             "client_ip": client_ip,
             "user_id": auth_data.telegram_id if auth_data else None,
             "key": key,
-            "token": request.headers.get("token", ""),
+            "token": headers.get("token", ""),
         }
 
+    def _format_body(self, body: bytes) -> str:
+        if not body:
+            return ""
+
+        try:
+            return self._protect_body(body=json.dumps(json.loads(body), ensure_ascii=False))
+        except (JSONDecodeError, UnicodeDecodeError):
+            return body.decode("utf-8", errors="replace")
+
     def _protect_body(self, body: str) -> str:
         return body
         # try:
@@ -2,6 +2,8 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, Path
 from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
 
 from app.api.dependencies.auth import get_current_user
 from app.api.dto.game.request import MakeBetRequest
@@ -16,10 +18,7 @@ from app.api.dto.game.response import (
     LaunchResponse,
     WheelPrizeResponse,
 )
-from app.db.models import BetConfig
-from app.db.models import Gift
 from app.db.models import GiftUser
-from app.db.models import WheelPrize
 from app.services.dto.auth import WebappData
 from app.services.game import GameService
 
@@ -60,9 +59,11 @@ async def spin_wheel(
     tags=["Wheel"],
 )
 async def get_winners(
+    request: Request,
     service: Annotated[GameService, Depends()],
-) -> list[WheelPrize]:
-    return await service.get_latest_wheel_winners()
+) -> Response:
+    resp = await service.get_latest_wheel_winners_response()
+    return resp.to_response(request=request)
 
 
 @router.get(
@@ -81,9 +82,9 @@ async def wheel_prizes() -> list[WheelPrizeResponse]:
     response_model=BetConfigResponse,
     tags=["Gifts"],
 )
-async def bets_config(service: Annotated[GameService, Depends()]) -> dict[list[BetConfig]]:
-    resp = await service.get_bets_config()
-    return resp
+async def bets_config(request: Request, service: Annotated[GameService, Depends()]) -> Response:
+    resp = await service.get_bets_config_response()
+    return resp.to_response(request=request)
 
 
 @router.post(
@@ -121,9 +122,9 @@ async def get_gifts(
     response_model=list[LatestGiftResponse],
     tags=["Gifts"],
 )
-async def get_gifts(service: Annotated[GameService, Depends()]) -> list[Gift]:
-    resp = await service.get_latest_gifts()
-    return resp
+async def get_gifts(request: Request, service: Annotated[GameService, Depends()]) -> Response:
+    resp = await service.get_latest_gifts_response()
+    return resp.to_response(request=request)
 
 
 @router.post(
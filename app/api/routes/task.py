@@ -30,6 +30,11 @@ async def give_offline_rocket(service: Annotated[TaskService, Depends()]) -> Non
     return await service.give_offline_rocket()
 
 
+@router.get(path="/task/send_premium_rocket_notifications", status_code=status.HTTP_200_OK)
+async def send_premium_rocket_notifications(service: Annotated[TaskService, Depends()]) -> None:
+    return await service.send_premium_rocket_notifications()
+
+
 @router.get(path="/task/check_user/{telegram_id}", status_code=status.HTTP_200_OK)
 async def check_user_exists(
     service: Annotated[TaskService, Depends()],
@@ -58,6 +63,21 @@ async def populate_gifts_latest(service: Annotated[TaskService, Depends()]) -> N
     return await service.populate_gifts_latest()
 
 
+@router.get(path="/task/invalidate_bets_config", status_code=status.HTTP_200_OK)
+async def invalidate_bets_config(service: Annotated[TaskService, Depends()]) -> None:
+    return await service.invalidate_bets_config()
+
+
 @router.get(path="/task/reset_richads", status_code=status.HTTP_200_OK)
 async def reset_richads(service: Annotated[TaskService, Depends()]) -> None:
     return await service.reset_richads()
+
+
+@router.get(path="/task/flush_presence", status_code=status.HTTP_200_OK)
+async def flush_presence(service: Annotated[TaskService, Depends()]) -> None:
+    return await service.flush_presence()
+
+
+@router.get(path="/task/maintain_transaction_partitions", status_code=status.HTTP_200_OK)
+async def maintain_transaction_partitions(service: Annotated[TaskService, Depends()]) -> None:
+    return await service.maintain_transaction_partitions()
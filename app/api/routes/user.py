@@ -2,6 +2,7 @@ from typing import Annotated
 
 import structlog
 from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.util import b64decode
 from starlette import status
 from starlette.websockets import WebSocket
@@ -9,10 +10,15 @@ from starlette.websockets import WebSocket
 from app.api.dependencies.auth import get_current_user
 from app.api.dependencies.stubs import dependency_websocket_service
 from app.api.dto.base import PaginatedRequest, PaginatedResponse
-from app.api.dto.user.request import UpdateUserRequest
-from app.api.dto.user.response import PublicUserResponse, UserResponse
-from app.db.models import User
+from app.api.dto.user.request import TransactionsRequest, UpdateUserRequest
+from app.api.dto.user.response import (
+    PublicUserResponse,
+    TransactionsResponse,
+    UserResponse,
+    user_payload,
+)
 from app.services.dto.auth import WebappData
+from app.services.transaction import TransactionService
 from app.services.user import UserService
 from app.services.websocket import WebsocketService
 
@@ -29,9 +35,10 @@ async def get_me(
     request: Request,
     current_user: Annotated[WebappData, Depends(get_current_user)],
     service: Annotated[UserService, Depends()],
-) -> User:
+) -> ORJSONResponse:
     current_user.country = request.headers.get("cf-ipcountry")
-    return await service.get_or_create_user(data=current_user)
+    user = await service.get_or_create_user(data=current_user)
+    return ORJSONResponse(content=user_payload(user=user))
 
 
 @router.patch(
@@ -43,8 +50,9 @@ async def update_me(
     data: UpdateUserRequest,
     service: Annotated[UserService, Depends()],
     current_user: Annotated[WebappData, Depends(get_current_user)],
-) -> User:
-    return await service.update_user(current_user=current_user, data=data)
+) -> ORJSONResponse:
+    user = await service.update_user(current_user=current_user, data=data)
+    return ORJSONResponse(content=user_payload(user=user))
 
 
 @router.get(
@@ -60,6 +68,19 @@ async def get_referrals(
     return await service.get_referrals(current_user=current_user, pagination=pagination)
 
 
+@router.get(
+    path="/user/transactions",
+    status_code=status.HTTP_200_OK,
+    response_model=TransactionsResponse,
+)
+async def get_transactions(
+    current_user: Annotated[WebappData, Depends(get_current_user)],
+    service: Annotated[TransactionService, Depends()],
+    data: TransactionsRequest = Depends(),
+) -> TransactionsResponse:
+    return await service.get_user_transactions(current_user=current_user, data=data)
+
+
 @router.post(path="/user/seen", status_code=status.HTTP_200_OK)
 async def set_seen(
     current_user: Annotated[WebappData, Depends(get_current_user)],
@@ -18,6 +18,8 @@ class AuthConfig(_BaseSettings):
 
     AUTH_TOKEN_TASK: str
     AUTH_CHECK_TELEGRAM_TOKEN: bool | None = True
+    AUTH_WEBAPP_CACHE_SIZE: int = 10_000
+    AUTH_WEBAPP_CACHE_TTL: int = 300
 
 
 class PostgresConfig(_BaseSettings):
@@ -60,6 +62,7 @@ class LogsConfig(_BaseSettings):
     LOGS_OTLP_ENDPOINT: str | None = None
     LOGS_OTLP_TOKEN: str | None = None
     LOGS_OLTP_ENABLED: bool | None = False
+    LOGS_BODY_SAMPLE_RATE: float = 0.0
 
 
 class TelegramBotConfig(_BaseSettings):
@@ -69,6 +72,49 @@ class TelegramBotConfig(_BaseSettings):
     TELEGRAM_BOT_TOKEN: str
 
 
+class HttpClientConfig(_BaseSettings):
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 30
+    HTTP_POOL_KEEPALIVE_TIMEOUT: float = 30
+    HTTP_POOL_DNS_CACHE_TTL: int = 300
+    HTTP_LOG_BODY_LIMIT: int = 4096
+
+
+class WebsocketConfig(_BaseSettings):
+    WS_SEND_QUEUE_SIZE: int = 100
+    WS_SEND_TIMEOUT: float = 10
+    WS_MAX_DROPS: int = 100
+
+
+class CacheConfig(_BaseSettings):
+    CACHE_VERSION_CHECK_INTERVAL: float = 5
+    CACHE_RESPONSES_SIZE: int = 64
+    CACHE_RESPONSES_TTL: float = 5
+    CACHE_WHEEL_WINNERS_TTL: float = 2
+    CACHE_LATEST_GIFTS_TTL: float = 5
+    CACHE_BETS_CONFIG_TTL: float = 10
+    CACHE_USER_SNAPSHOT_TTL: int = 300
+    CACHE_USER_VERSION_TTL: int = 24 * 60 * 60
+
+
+class SchedulerConfig(_BaseSettings):
+    SCHEDULER_LEASE_TTL: float = 30
+    SCHEDULER_JITTER: float = 5
+    SCHEDULER_METRICS_PORT: int | None = None
+
+
+class FeedConfig(_BaseSettings):
+    FEED_SIZE: int = 100
+    FEED_WHEEL_WINNERS_WINDOW: float = 60
+    FEED_LATEST_GIFTS_LIMIT: int = 6
+
+
+class LedgerConfig(_BaseSettings):
+    LEDGER_PARTITIONS_AHEAD: int = 3
+    LEDGER_RETENTION_MONTHS: int = 24
+    LEDGER_LOCK_TIMEOUT: float = 5
+
+
 class PrometheusConfig(_BaseSettings):
     PROMETHEUS_APP_NAME: str | None = Field(default="BackendAPI")
     PROMETHEUS_PREFIX: str | None = Field(default="fastapi")
@@ -84,6 +130,12 @@ class AlertsConfig(_BaseSettings):
     ALERTS_TELEGRAM_BOT_TOKEN: str
     ALERTS_TELEGRAM_CHAT_ID: int
 
+    ALERTS_QUEUE_SIZE: int = 1000
+    ALERTS_DEDUP_WINDOW: float = 60
+    ALERTS_FLUSH_INTERVAL: float = 2
+    ALERTS_MIN_SEND_INTERVAL: float = 3
+    ALERTS_CLOSE_TIMEOUT: float = 10
+
 
 class ScannerConfig(_BaseSettings):
     SCANNER_WEBHOOK_URL: str
@@ -97,6 +149,12 @@ class Config(_BaseSettings):
     logs: LogsConfig
     alerts: AlertsConfig
     bot: TelegramBotConfig
+    http: HttpClientConfig
+    websocket: WebsocketConfig
+    cache: CacheConfig
+    feed: FeedConfig
+    scheduler: SchedulerConfig
+    ledger: LedgerConfig
     prometheus: PrometheusConfig
     scanner: ScannerConfig
 
@@ -109,6 +167,12 @@ def get_config() -> Config:
         logs=LogsConfig(),
         alerts=AlertsConfig(),
         bot=TelegramBotConfig(),
+        http=HttpClientConfig(),
+        websocket=WebsocketConfig(),
+        cache=CacheConfig(),
+        feed=FeedConfig(),
+        scheduler=SchedulerConfig(),
+        ledger=LedgerConfig(),
         prometheus=PrometheusConfig(),
         scanner=ScannerConfig(),
     )
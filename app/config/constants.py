@@ -1,6 +1,26 @@
 JWT_ALGORYTHM = "HS256"
 POSTGRES_TIMEOUT = 60
 DEFAULT_HTTP_TIMEOUT = 20
+TELEGRAM_MESSAGE_LIMIT = 4096
+BETS_CONFIG_VERSION_KEY = "bets_config:version"
+WHEEL_WINNERS_RESPONSE_KEY = "wheel_winners"
+LATEST_GIFTS_RESPONSE_KEY = "latest_gifts"
+BETS_CONFIG_RESPONSE_KEY = "bets_config"
+WHEEL_WINNERS_FEED_KEY = "feed:wheel_winners"
+LATEST_GIFTS_FEED_KEY = "feed:latest_gifts"
+PREMIUM_ROCKET_NOTIFICATIONS_KEY = "notifications:premium_rocket"
+USER_SNAPSHOT_KEY = "user:snapshot:{telegram_id}"
+USER_VERSION_KEY = "user:version:{telegram_id}"
+USER_SNAPSHOT_EPOCH_KEY = "user:snapshot:epoch"
+PRESENCE_KEY = "presence:last_online"
+PRESENCE_FLUSHING_KEY = "presence:last_online:flushing"
+ACTIVE_USERS_KEY = "presence:active"
+ACTIVE_USERS_SEEDED_KEY = "presence:active:seeded"
+CHANGED_USERS_INFO_KEY = "changed_users"
+ALL_USERS_CHANGED_INFO_KEY = "all_users_changed"
+AFTER_COMMIT_INFO_KEY = "after_commit"
+ON_COMMIT_INFO_KEY = "on_commit"
+TRANSACTIONS_PARTITION_NAME = "transactions_y{year}m{month:02d}"
 
 LOGGING_SENSITIVE_FIELDS = (
 )
@@ -26,6 +46,7 @@ WHEEL_AD_TIMEOUT = 60
 ROCKET_TIMEOUT_DEFAULT = 60 * 6
 ROCKET_TIMEOUT_OFFLINE = 60
 ROCKET_TIMEOUT_PREMIUM = 60 * 24
+ACTIVE_USERS_WINDOW = 60 * 60 * 24
 
 
 FUEL_CAPACITY_MAP = {
@@ -35,3 +56,8 @@ FUEL_CAPACITY_MAP = {
 }
 
 TON_PRICE = 3
+
+# cron tasks run every minute, a run stops taking new chunks after the budget
+TASK_CHUNK_SIZE = 5000
+TASK_TIME_BUDGET = 45
+NOTIFICATIONS_BATCH_SIZE = 300
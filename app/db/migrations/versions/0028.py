@@ -0,0 +1,42 @@
+"""add recent activity indexes
+
+Revision ID: 0028
+Revises: 0027
+Create Date: 2026-10-18 12:10:41.512093
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = '0028'
+down_revision = '0027'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # wheel_prizes and gifts_users take writes on every spin and bet, build without blocking them
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_wheel_prizes_created_at',
+            'wheel_prizes',
+            ['created_at'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_gifts_users_latest',
+            'gifts_users',
+            ['created_at'],
+            unique=False,
+            postgresql_where=sa.text('gift_id IS NOT NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_gifts_users_latest', table_name='gifts_users', postgresql_concurrently=True)
+        op.drop_index('ix_wheel_prizes_created_at', table_name='wheel_prizes', postgresql_concurrently=True)
@@ -0,0 +1,41 @@
+"""add cron scan indexes
+
+Revision ID: 0029
+Revises: 0028
+Create Date: 2026-10-18 16:42:07.318224
+
+"""
+from alembic import op
+
+
+revision = '0029'
+down_revision = '0028'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # users and rockets are hot tables, build without blocking writes
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_last_online_id',
+            'users',
+            ['last_online', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_rockets_user_id_type',
+            'rockets',
+            ['user_id', 'type'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_rockets_user_id_type', table_name='rockets', postgresql_concurrently=True)
+        op.drop_index('ix_users_last_online_id', table_name='users', postgresql_concurrently=True)
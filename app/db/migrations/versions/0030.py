@@ -0,0 +1,103 @@
+"""partition transactions by month
+
+Revision ID: 0030
+Revises: 0029
+Create Date: 2026-10-18 19:12:44.503126
+
+"""
+import datetime
+
+from alembic import op
+
+
+revision = '0030'
+down_revision = '0029'
+branch_labels = None
+depends_on = None
+
+PARTITIONS_AHEAD = 3
+
+
+def _add_months(day: datetime.date, months: int) -> datetime.date:
+    month = day.month - 1 + months
+    return datetime.date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    # the existing rows become the partition below this bound, created_at of new rows is always later
+    bound = _add_months(datetime.datetime.utcnow().date(), 1)
+
+    # built on the live table without blocking writes, then reused by the attach instead of a rebuild and a scan
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS transactions_legacy_pkey '
+            'ON transactions (id, created_at)'
+        )
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS transactions_legacy_user_id_created_at_id_idx '
+            'ON transactions (user_id, created_at, id)'
+        )
+        op.execute(
+            f"ALTER TABLE transactions ADD CONSTRAINT transactions_legacy_bound "
+            f"CHECK (created_at < '{bound}') NOT VALID"
+        )
+        op.execute('ALTER TABLE transactions VALIDATE CONSTRAINT transactions_legacy_bound')
+
+    # a unique key on a partitioned table must include created_at, so nothing can reference transactions.id
+    op.execute('ALTER TABLE rockets DROP CONSTRAINT IF EXISTS rockets_transactions_fkey')
+    op.execute('ALTER TABLE rockets DROP CONSTRAINT IF EXISTS rockets_transaction_id_fkey')
+    op.execute('ALTER TABLE invoices DROP CONSTRAINT IF EXISTS invoices_transaction_id_fkey')
+    op.execute('ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_refund_id_fkey')
+
+    op.execute('ALTER TABLE transactions RENAME TO transactions_legacy')
+    op.execute('ALTER TABLE transactions_legacy DROP CONSTRAINT transactions_pkey')
+    op.execute(
+        'ALTER TABLE transactions_legacy ADD CONSTRAINT transactions_legacy_pkey '
+        'PRIMARY KEY USING INDEX transactions_legacy_pkey'
+    )
+
+    op.execute(
+        'CREATE TABLE transactions (LIKE transactions_legacy INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (created_at)'
+    )
+    op.execute('ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id')
+    op.execute('ALTER TABLE transactions ADD CONSTRAINT transactions_pkey PRIMARY KEY (id, created_at)')
+    op.execute(
+        'ALTER TABLE transactions ADD CONSTRAINT transactions_user_id_fkey '
+        'FOREIGN KEY (user_id) REFERENCES users (telegram_id)'
+    )
+    op.execute('CREATE INDEX ix_transactions_user_id_created_at ON transactions (user_id, created_at, id)')
+
+    op.execute(
+        f"ALTER TABLE transactions ATTACH PARTITION transactions_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{bound}')"
+    )
+    op.execute('ALTER TABLE transactions_legacy DROP CONSTRAINT transactions_legacy_bound')
+
+    for month in range(PARTITIONS_AHEAD):
+        start, end = _add_months(bound, month), _add_months(bound, month + 1)
+        op.execute(
+            f"CREATE TABLE transactions_y{start.year}m{start.month:02d} PARTITION OF transactions "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+
+    # rows past the created partitions land here until TaskService.maintain_transaction_partitions catches up
+    op.execute('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT')
+
+
+def downgrade() -> None:
+    # partitions detached by the retention job are archive tables now, their rows do not come back
+    op.execute('ALTER TABLE transactions RENAME TO transactions_partitioned')
+    op.execute('CREATE TABLE transactions (LIKE transactions_partitioned INCLUDING DEFAULTS)')
+    op.execute('INSERT INTO transactions SELECT * FROM transactions_partitioned')
+    op.execute('ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id')
+    op.execute('DROP TABLE transactions_partitioned CASCADE')
+
+    op.execute('ALTER TABLE transactions ADD CONSTRAINT transactions_pkey PRIMARY KEY (id)')
+    op.execute(
+        'ALTER TABLE transactions ADD CONSTRAINT transactions_user_id_fkey '
+        'FOREIGN KEY (user_id) REFERENCES users (telegram_id)'
+    )
+    op.create_foreign_key('transactions_refund_id_fkey', 'transactions', 'transactions', ['refund_id'], ['id'])
+    op.create_foreign_key('invoices_transaction_id_fkey', 'invoices', 'transactions', ['transaction_id'], ['id'])
+    op.create_foreign_key('rockets_transactions_fkey', 'rockets', 'transactions', ['transaction_id'], ['id'])
@@ -6,12 +6,14 @@ from sqlalchemy import (
     BigInteger,
     Boolean,
     ForeignKey,
+    Index,
     Integer,
     Numeric,
     String,
     UniqueConstraint,
     func,
     inspect,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -142,6 +144,7 @@ class _TimestampMixin(Base):
 
 class User(_TimestampMixin, Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_last_online_id", "last_online", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
@@ -224,6 +227,7 @@ class User(_TimestampMixin, Base):
 
 class Rocket(_TimestampMixin, Base):
     __tablename__ = "rockets"
+    __table_args__ = (Index("ix_rockets_user_id_type", "user_id", "type"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.telegram_id", ondelete="CASCADE"))
@@ -233,15 +237,27 @@ class Rocket(_TimestampMixin, Base):
     current_fuel: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     enabled: Mapped[bool] = mapped_column(Boolean, default=True, server_default="true")
     seen: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
-    transaction_id: Mapped[int] = mapped_column(ForeignKey("transactions.id"), nullable=True)
+    transaction_id: Mapped[int] = mapped_column(Integer, nullable=True)
 
     user: Mapped[User] = relationship(back_populates="rockets")
 
 
 class Transaction(_TimestampMixin, Base):
+    """Append-only ledger, partitioned by month of created_at, which is why it is part of the primary key"""
+
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_user_id_created_at", "user_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        TIMESTAMP,
+        primary_key=True,
+        default=datetime.datetime.utcnow,
+        server_default=func.now(),
+    )
     user_id: Mapped[int] = mapped_column(ForeignKey("users.telegram_id"))
 
     balance_before: Mapped[float] = mapped_column(Numeric, nullable=True)
@@ -251,11 +267,12 @@ class Transaction(_TimestampMixin, Base):
 
     type: Mapped[TransactionTypeEnum] = mapped_column(String)
     status: Mapped[TransactionStatusEnum] = mapped_column(String)
-    refund_id: Mapped[int] = mapped_column(ForeignKey("transactions.id"), nullable=True)
+    refund_id: Mapped[int] = mapped_column(Integer, nullable=True)
 
 
 class WheelPrize(_TimestampMixin, Base):
     __tablename__ = "wheel_prizes"
+    __table_args__ = (Index("ix_wheel_prizes_created_at", "created_at"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.telegram_id"))
@@ -281,7 +298,7 @@ class Invoice(_TimestampMixin, Base):
     currency_fee: Mapped[float] = mapped_column(Numeric, nullable=True)
     usd_amount: Mapped[float] = mapped_column(Numeric)
 
-    transaction_id: Mapped[int] = mapped_column(ForeignKey("transactions.id"), nullable=True)
+    transaction_id: Mapped[int] = mapped_column(Integer, nullable=True)
     rocket_id: Mapped[int] = mapped_column(ForeignKey("rockets.id"), nullable=True)
     rocket_skin: Mapped[RocketSkinEnum] = mapped_column(String, nullable=True)
 
@@ -380,6 +397,9 @@ class Gift(_TimestampMixin, Base):
 
 class GiftUser(_TimestampMixin, Base):
     __tablename__ = "gifts_users"
+    __table_args__ = (
+        Index("ix_gifts_users_latest", "created_at", postgresql_where=text("gift_id IS NOT NULL")),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
@@ -9,7 +9,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import InstrumentedAttribute
 
 from app.api.dto.base import PaginatedRequest
-from app.config.constants import POSTGRES_TIMEOUT
+from app.config.constants import (
+    ALL_USERS_CHANGED_INFO_KEY,
+    CHANGED_USERS_INFO_KEY,
+    POSTGRES_TIMEOUT,
+)
 from app.db.models import Base
 
 logger = structlog.stdlib.get_logger()
@@ -68,6 +72,14 @@ class BaseRepo:
             total=total,
         )
 
+    def mark_users_changed(self, *telegram_ids: int) -> None:
+        """Users or rockets of these users were changed, their snapshots are dropped once the session commits"""
+
+        self.session.info.setdefault(CHANGED_USERS_INFO_KEY, set()).update(telegram_ids)
+
+    def mark_all_users_changed(self) -> None:
+        self.session.info[ALL_USERS_CHANGED_INFO_KEY] = True
+
     def transaction(self, timeout: int | None = None) -> AsyncContextManager[AsyncSession]:
         @asynccontextmanager
         async def wrapped() -> AsyncContextManager[AsyncSession]:
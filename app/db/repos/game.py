@@ -1,8 +1,8 @@
-from collections import defaultdict
+from datetime import timedelta
 from typing import Sequence
 
 from sqlalchemy import desc
-from sqlalchemy import func, literal_column, select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.functions import now
@@ -71,33 +71,23 @@ class GameRepo(BaseRepo):
         query = await self.session.execute(stmt)
         return query.scalars().all()
 
-    async def get_bets_config_amount(self, amount: float) -> Sequence[BetConfig]:
-        stmt = select(BetConfig).options(joinedload(BetConfig.collection)).where(BetConfig.bet_from == amount)
-        query = await self.session.execute(stmt)
-        return query.scalars().all()
-
-    async def get_bets_config(self) -> dict[list[BetConfig]]:
+    async def get_bets_config(self) -> Sequence[BetConfig]:
         stmt = select(BetConfig).options(joinedload(BetConfig.collection))
         query = await self.session.execute(stmt)
-        configs = query.scalars().all()
-
-        resp = defaultdict(list)
-
-        for config in configs:
-            resp[config.bet_from].append(config)
-
-        return resp
+        return query.scalars().all()
 
     async def get_rocket(self, rocket_type: RocketTypeEnum) -> Rocket:
         stmt = select(Rocket).where(Rocket.type == rocket_type)
         query = await self.session.execute(stmt)
         return query.scalar_one()
 
-    async def get_wheel_winners(self) -> Sequence[WheelPrize]:
+    async def get_wheel_winners(self, window: float, limit: int) -> Sequence[WheelPrize]:
         stmt = (
             select(WheelPrize)
-            .where(WheelPrize.created_at > (func.now() - literal_column("interval '60 seconds'")))
+            .where(WheelPrize.created_at > (func.now() - timedelta(seconds=window)))
             .options(joinedload(WheelPrize.user))
+            .order_by(desc(WheelPrize.created_at))
+            .limit(limit)
         )
 
         query = await self.session.execute(stmt)
@@ -123,4 +113,8 @@ class GameRepo(BaseRepo):
         return stmt.scalar_one_or_none()
 
     async def update_rocket(self, rocket_id: int, **kwargs) -> Rocket:
-        return await self.update(Rocket, Rocket.id == rocket_id, **kwargs)
+        rocket = await self.update(Rocket, Rocket.id == rocket_id, **kwargs)
+        if rocket:
+            self.mark_users_changed(rocket.user_id)
+
+        return rocket
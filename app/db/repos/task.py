@@ -1,20 +1,53 @@
+from datetime import datetime
 from typing import Sequence
 
-from sqlalchemy import desc
-from sqlalchemy import func, or_, select, text
-from sqlalchemy import update
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    Integer,
+    Row,
+    Select,
+    String,
+    any_,
+    case,
+    column,
+    desc,
+    exists,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    text,
+    true,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
 from app.config.constants import (
     WHEEL_TIMEOUT,
 )
-from app.db.models import Collection
-from app.db.models import Gift
-from app.db.models import GiftStatusEnum
-from app.db.models import GiftUserStatusEnum
-from app.db.models import User
+from app.db.models import (
+    Collection,
+    CurrenciesEnum,
+    Gift,
+    GiftStatusEnum,
+    GiftUserStatusEnum,
+    Rocket,
+    RocketTypeEnum,
+    Transaction,
+    TransactionStatusEnum,
+    TransactionTypeEnum,
+    User,
+)
 from app.db.repos.base.base import BaseRepo
 
+Cursor = tuple[datetime, int]
+
 
 class TaskRepo(BaseRepo):
     def __init__(self, session: AsyncSession):
@@ -28,6 +61,7 @@ class TaskRepo(BaseRepo):
     async def reset_richads(self) -> None:
         stmt = update(User).where(User.id > 0).values(rich_ads_tasks=0)
         await self.session.execute(stmt)
+        self.mark_all_users_changed()
 
     async def get_collection(self, slug: str) -> Collection | None:
         stmt = select(Collection).where(Collection.slug == slug)
@@ -49,30 +83,210 @@ class TaskRepo(BaseRepo):
         query = await self.session.execute(stmt)
         return query.scalar_one_or_none()
 
-    async def get_offline_rocket_users(self) -> Sequence[User]:
-        stmt = select(User).where(
-            or_(
-                User.next_default_rocket_at <= func.now(),
-                User.next_offline_rocket_at <= func.now(),
-                User.next_premium_rocket_at <= func.now(),
-            ),
-            User.last_online >= func.now() - text(f"INTERVAL '1 day'"),
+    @staticmethod
+    def _after(cursor: Cursor | None) -> ColumnElement[bool]:
+        # (last_online, id) keyset, walks ix_users_last_online_id in index order
+        if cursor is None:
+            return true()
+
+        return tuple_(User.last_online, User.id) > tuple_(*cursor)
+
+    def _candidates(
+        self,
+        after: Cursor | None,
+        window: str,
+        telegram_ids: list[int] | None,
+    ) -> list[ColumnElement[bool]]:
+        # active users come from the presence set when it is given, else from last_online
+        if telegram_ids is not None:
+            return [User.telegram_id == any_(literal(telegram_ids, ARRAY(BigInteger)))]
+
+        return [self._after(cursor=after), User.last_online >= func.now() - text(f"INTERVAL '{window}'")]
+
+    async def get_active_users(self, after: Cursor | None, limit: int) -> Sequence[Row]:
+        stmt = (
+            select(User.id, User.last_online, User.telegram_id)
+            .where(*self._candidates(after=after, window="1 day", telegram_ids=None))
+            .order_by(User.last_online, User.id)
+            .limit(limit)
         )
 
         query = await self.session.execute(stmt)
-        return query.scalars().all()
+        return query.all()
 
-    async def get_wheel_users(self) -> Sequence[User]:
+    async def get_offline_rocket_users(
+        self,
+        after: Cursor | None,
+        limit: int,
+        telegram_ids: list[int] | None = None,
+    ) -> Sequence[Row]:
         stmt = (
-            select(User)
+            select(User.id, User.last_online, User.telegram_id, User.tg_language_code)
             .where(
+                *self._candidates(after=after, window="1 day", telegram_ids=telegram_ids),
+                or_(
+                    User.next_default_rocket_at <= func.now(),
+                    User.next_offline_rocket_at <= func.now(),
+                    User.next_premium_rocket_at <= func.now(),
+                ),
+            )
+            .order_by(User.last_online, User.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        query = await self.session.execute(stmt)
+        return query.all()
+
+    async def create_missing_rockets(self, telegram_ids: list[int], rockets: Sequence[dict]) -> Sequence[Row]:
+        kinds = values(
+            column("type", String),
+            column("fuel_capacity", Integer),
+            name="kinds",
+        ).data([(rocket["type"].value, rocket["fuel_capacity"]) for rocket in rockets])
+
+        next_rocket_at = case(
+            {
+                rocket["type"].value: getattr(User, f"next_{rocket['type'].value}_rocket_at")
+                for rocket in rockets
+            },
+            value=kinds.c.type,
+        )
+        exists_rocket = exists().where(Rocket.user_id == User.telegram_id, Rocket.type == kinds.c.type)
+
+        source = (
+            select(User.telegram_id, kinds.c.type, kinds.c.fuel_capacity, literal(0))
+            .select_from(User)
+            .join(kinds, true())
+            .where(
+                User.telegram_id == any_(literal(telegram_ids, ARRAY(BigInteger))),
+                next_rocket_at <= func.now(),
+                ~exists_rocket,
+            )
+        )
+
+        stmt = (
+            insert(Rocket)
+            .from_select(["user_id", "type", "fuel_capacity", "current_fuel"], source)
+            .returning(Rocket.user_id, Rocket.type)
+        )
+
+        query = await self.session.execute(stmt)
+        created = query.all()
+        self.mark_users_changed(*(row.user_id for row in created))
+        return created
+
+    async def set_next_rocket_at(
+        self,
+        given: dict[RocketTypeEnum, list[int]],
+        next_at: dict[RocketTypeEnum, datetime],
+    ) -> None:
+        given = {rocket_type: telegram_ids for rocket_type, telegram_ids in given.items() if telegram_ids}
+        if not given:
+            return
+
+        telegram_ids = {telegram_id for ids in given.values() for telegram_id in ids}
+        stmt = (
+            update(User)
+            .where(User.telegram_id == any_(literal(list(telegram_ids), ARRAY(BigInteger))))
+            .values(
+                {
+                    getattr(User, f"next_{rocket_type.value}_rocket_at"): case(
+                        (User.telegram_id == any_(literal(ids, ARRAY(BigInteger))), next_at[rocket_type]),
+                        else_=getattr(User, f"next_{rocket_type.value}_rocket_at"),
+                    )
+                    for rocket_type, ids in given.items()
+                }
+            )
+        )
+        await self.session.execute(stmt)
+        self.mark_users_changed(*telegram_ids)
+
+    def _wheel_users(self, after: Cursor | None, limit: int, telegram_ids: list[int] | None) -> Select:
+        return (
+            select(User.id, User.last_online, User.telegram_id)
+            .where(
+                *self._candidates(after=after, window=f"{WHEEL_TIMEOUT} minutes", telegram_ids=telegram_ids),
                 User.next_wheel_at <= func.now(),
-                User.last_online >= func.now() - text(f"INTERVAL '{WHEEL_TIMEOUT} minutes'"),
             )
+            .order_by(User.last_online, User.id)
+            .limit(limit)
+        )
+
+    async def get_wheel_users(
+        self,
+        after: Cursor | None,
+        limit: int,
+        telegram_ids: list[int] | None = None,
+    ) -> Sequence[Row]:
+        query = await self.session.execute(self._wheel_users(after=after, limit=limit, telegram_ids=telegram_ids))
+        return query.all()
+
+    async def give_wheels(
+        self,
+        after: Cursor | None,
+        limit: int,
+        next_wheel_at: datetime,
+        telegram_ids: list[int] | None = None,
+    ) -> tuple[datetime, int, int] | None:
+        """
+        Credits one wheel to a chunk of eligible users and writes their ledger rows.
+        Returns (last_online, id, count) of the last user in the chunk, None when nothing was left
+        """
+
+        chunk = (
+            self._wheel_users(after=after, limit=limit, telegram_ids=telegram_ids)
+            .with_for_update(skip_locked=True)
+            .cte("chunk")
+        )
+
+        updated = (
+            update(User)
+            .where(User.id == chunk.c.id)
+            .values(wheel_balance=User.wheel_balance + 1, next_wheel_at=next_wheel_at)
+            .returning(User.id, User.last_online, User.telegram_id, User.wheel_balance)
+            .cte("updated")
+        )
+
+        extra = dict(
+            balance_amount=1,
+            balance_currency=CurrenciesEnum.wheel.value,
+            type=TransactionTypeEnum.retention.value,
+            status=TransactionStatusEnum.success.value,
+        )
+        source = select(
+            updated.c.telegram_id,
+            updated.c.wheel_balance - 1,
+            updated.c.wheel_balance,
+            *(literal(value, type_=getattr(Transaction, key).type) for key, value in extra.items()),
+        )
+        inserted = (
+            insert(Transaction)
+            .from_select(["user_id", "balance_before", "balance_after", *extra], source)
+            .returning(Transaction.user_id)
+            .cte("inserted")
+        )
+
+        # data-modifying CTEs run to completion even though only their user ids are read
+        stmt = (
+            select(
+                updated.c.last_online,
+                updated.c.id,
+                select(func.array_agg(inserted.c.user_id)).scalar_subquery(),
+            )
+            .order_by(desc(updated.c.last_online), desc(updated.c.id))
+            .limit(1)
+            .add_cte(chunk, updated, inserted)
         )
 
         query = await self.session.execute(stmt)
-        return query.scalars().all()
+        row = query.one_or_none()
+        if row is None:
+            return None
+
+        last_online, last_id, telegram_ids = row
+        self.mark_users_changed(*telegram_ids)
+        return last_online, last_id, len(telegram_ids)
 
     async def get_fake_available_gifts(self, blacklist: list[int]) -> Sequence[Gift]:
         stmt = (
@@ -81,6 +295,7 @@ class TaskRepo(BaseRepo):
                 Gift.id.not_in(blacklist),
                 Gift.status == GiftStatusEnum.available,
             )
+            .options(joinedload(Gift.collection))
             .order_by(desc(Gift.transfer_date))
             .limit(10)
         )
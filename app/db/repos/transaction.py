@@ -1,9 +1,75 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy import (
+    Integer,
+    Numeric,
+    String,
+    case,
+    column,
+    insert,
+    literal,
+    select,
+    text,
+    true,
+    tuple_,
+    update,
+    values,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models import Roll
-from app.db.models import Transaction
+from app.db.models import (
+    CurrenciesEnum,
+    Roll,
+    Transaction,
+    TransactionStatusEnum,
+    TransactionTypeEnum,
+    User,
+)
 from app.db.repos.base.base import BaseRepo
 
+TransactionCursor = tuple[datetime, int]
+
+_PARTITION_BOUND = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+@dataclass
+class TransactionPartition:
+    """A partition of the ledger, start and end are None for MINVALUE / MAXVALUE and for the default partition"""
+
+    name: str
+    start: datetime | None
+    end: datetime | None
+    default: bool = False
+
+
+def _partition_bound(value: str) -> datetime | None:
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def _balance_totals(
+    amounts: list[tuple[CurrenciesEnum, Decimal]],
+) -> tuple[dict[CurrenciesEnum, Decimal], dict[CurrenciesEnum, Decimal]]:
+    """
+    Net amount and the lowest running sum per currency, in the order of amounts.
+    A debit is checked against the lowest running sum: a spin paid with a wheel and won as a wheel nets to 0,
+    but still needs a wheel on the balance
+    """
+
+    totals: dict[CurrenciesEnum, Decimal] = {}
+    floors: dict[CurrenciesEnum, Decimal] = {}
+    for currency, amount in amounts:
+        totals[currency] = totals.get(currency, 0) + amount
+        floors[currency] = min(floors.get(currency, 0), totals[currency])
+
+    return totals, floors
+
 
 class TransactionRepo(BaseRepo):
     def __init__(self, session: AsyncSession):
@@ -18,3 +84,132 @@ class TransactionRepo(BaseRepo):
         model = Transaction(**kwargs)
         self.session.add(model)
         return model
+
+    async def change_balances(
+        self,
+        telegram_id: int,
+        amounts: list[tuple[CurrenciesEnum, Decimal]],
+        tx_type: TransactionTypeEnum,
+        tx_kwargs: dict[str, Any],
+        user_kwargs: dict[str, Any],
+    ) -> list[Transaction]:
+        """
+        Conditional update of every touched balance and one ledger row per amount, in one statement.
+        Returns the transactions in the order of amounts, an empty list if any balance is not enough
+        """
+
+        totals, floors = _balance_totals(amounts=amounts)
+        balances = {currency: getattr(User, f"{currency.value}_balance") for currency in totals}
+
+        updated = (
+            update(User)
+            .where(
+                User.telegram_id == telegram_id,
+                *(balances[currency] + floor >= 0 for currency, floor in floors.items()),
+            )
+            .values({balances[currency]: balances[currency] + total for currency, total in totals.items()})
+            .values(**user_kwargs)
+            .returning(
+                User.telegram_id.label("user_id"),
+                *(balance.label(currency.value) for currency, balance in balances.items()),
+            )
+            .cte("updated")
+        )
+
+        # rows of the same currency are chained: a row ends where the next one of its currency starts
+        rows = []
+        for position, (currency, amount) in enumerate(amounts):
+            later = sum((a for c, a in amounts[position + 1:] if c == currency), Decimal(0))
+            rows.append((position, currency.value, amount, later))
+
+        deltas = values(
+            column("position", Integer),
+            column("currency", String),
+            column("amount", Numeric),
+            column("later", Numeric),
+            name="deltas",
+        ).data(rows)
+
+        balance_after = case(
+            {currency.value: updated.c[currency.value] for currency in totals},
+            value=deltas.c.currency,
+        ) - deltas.c.later
+
+        extra = dict(type=tx_type.value, status=TransactionStatusEnum.success.value, **tx_kwargs)
+
+        source = (
+            select(
+                updated.c.user_id,
+                balance_after - deltas.c.amount,
+                balance_after,
+                deltas.c.amount,
+                deltas.c.currency,
+                *(literal(value, type_=getattr(Transaction, key).type) for key, value in extra.items()),
+            )
+            .select_from(updated.join(deltas, true()))
+            .order_by(deltas.c.position)
+        )
+
+        columns = ["user_id", "balance_before", "balance_after", "balance_amount", "balance_currency", *extra]
+        stmt = insert(Transaction).from_select(columns, source).add_cte(updated).returning(Transaction)
+        stmt = select(Transaction).from_statement(stmt)
+
+        query = await self.session.execute(stmt)
+        self.mark_users_changed(telegram_id)
+        return sorted(query.scalars().all(), key=lambda tx: tx.id)
+
+    async def get_user_transactions(
+        self,
+        telegram_id: int,
+        limit: int,
+        before: TransactionCursor | None = None,
+    ) -> list[Transaction]:
+        """Newest first. Keyset pagination on (created_at, id) walks ix_transactions_user_id_created_at backwards"""
+
+        stmt = (
+            select(Transaction)
+            .where(Transaction.user_id == telegram_id)
+            .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+            .limit(limit)
+        )
+
+        if before:
+            stmt = stmt.where(tuple_(Transaction.created_at, Transaction.id) < tuple_(*before))
+
+        query = await self.session.execute(stmt)
+        return list(query.scalars().all())
+
+    async def set_lock_timeout(self, seconds: float) -> None:
+        # partition DDL locks the whole ledger, waiting for a long transaction would stall every balance change
+        await self.session.execute(text(f"SET LOCAL lock_timeout = '{int(seconds * 1000)}ms'"))
+
+    async def get_partitions(self) -> list[TransactionPartition]:
+        stmt = text(
+            "SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        )
+        query = await self.session.execute(stmt, dict(parent=Transaction.__tablename__))
+
+        partitions = []
+        for name, bound in query.all():
+            match = _PARTITION_BOUND.search(bound)
+            if not match:
+                partitions.append(TransactionPartition(name=name, start=None, end=None, default=True))
+                continue
+
+            start, end = (_partition_bound(value=value) for value in match.groups())
+            partitions.append(TransactionPartition(name=name, start=start, end=end))
+
+        return sorted(partitions, key=lambda partition: (partition.default, partition.start or datetime.min))
+
+    async def create_partition(self, name: str, start: datetime, end: datetime) -> None:
+        await self.session.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {Transaction.__tablename__} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+
+    async def detach_partition(self, name: str) -> None:
+        await self.session.execute(text(f"ALTER TABLE {Transaction.__tablename__} DETACH PARTITION {name}"))
@@ -1,7 +1,8 @@
 from datetime import datetime
 from datetime import timedelta
 
-from sqlalchemy import select, update
+from sqlalchemy import TIMESTAMP, BigInteger, Integer, Text, column, func, literal, or_, select, update, values
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dto.base import PaginatedRequest
@@ -67,6 +68,7 @@ class UserRepo(BaseRepo):
     async def create_user_rocket(self, **kwargs) -> Rocket:
         rocket = Rocket(**kwargs)
         self.session.add(rocket)
+        self.mark_users_changed(rocket.user_id)
         return rocket
 
     async def get_user_by_telegram_id(self, telegram_id: int = None) -> User | None:
@@ -81,8 +83,40 @@ class UserRepo(BaseRepo):
         return query.scalar_one()
 
     async def update_user(self, telegram_id: int, **kwargs) -> User:
+        self.mark_users_changed(telegram_id)
         return await self.update(User, User.telegram_id == telegram_id, **kwargs)
 
+    async def change_rolls(
+        self,
+        telegram_id: int,
+        amount: float,
+        count: int,
+        use_boost: bool = False,
+    ) -> User | None:
+        """
+        Adds ``count`` rolls of ``amount`` (spends them when negative) with one conditional jsonb_set,
+        instead of rewriting the whole dict. Returns None when the user has not enough of them
+        """
+
+        key = str(float(amount))
+        current = func.coalesce(User.rolls[key].astext.cast(Integer), 0)
+
+        user_kwargs = dict(boost_balance=func.greatest(User.boost_balance - 1, 0)) if use_boost else {}
+        stmt = (
+            update(User)
+            .where(User.telegram_id == telegram_id, current + count >= 0)
+            .values(
+                rolls=func.jsonb_set(User.rolls, literal([key], ARRAY(Text)), func.to_jsonb(current + count)),
+                **user_kwargs,
+            )
+            .returning(User)
+        )
+        stmt = select(User).from_statement(stmt).execution_options(synchronize_session="fetch")
+
+        query = await self.session.execute(stmt)
+        self.mark_users_changed(telegram_id)
+        return query.scalar_one_or_none()
+
     async def get_referrals(self, telegram_id: int, pagination: PaginatedRequest) -> PaginatedResult[User]:
         stmt = select(User).where(User.referral_from == telegram_id)
         return await self.paginate(stmt=stmt, pagination=pagination, count=User.id)
@@ -90,3 +124,22 @@ class UserRepo(BaseRepo):
     async def set_seen(self, telegram_id: int) -> None:
         stmt = update(Rocket).where(Rocket.user_id == telegram_id).values(seen=True)
         await self.session.execute(stmt)
+        self.mark_users_changed(telegram_id)
+
+    async def set_last_online(self, entries: list[tuple[int, datetime]]) -> None:
+        seen = values(
+            column("telegram_id", BigInteger),
+            column("last_online", TIMESTAMP),
+            name="seen",
+        ).data(entries)
+
+        stmt = (
+            update(User)
+            .where(
+                User.telegram_id == seen.c.telegram_id,
+                # last_online is nullable, a user never seen before gets the heartbeat too
+                or_(User.last_online.is_(None), User.last_online < seen.c.last_online),
+            )
+            .values(last_online=seen.c.last_online)
+        )
+        await self.session.execute(stmt)
@@ -1,20 +1,23 @@
 from datetime import datetime
 from types import SimpleNamespace
-from typing import Any
+from typing import Any, Iterator
 
 import aiohttp
+import structlog
 from aiohttp import (
     ClientConnectionError,
     ClientResponse,
     ClientSession,
     TraceRequestChunkSentParams,
-    TraceRequestEndParams,
     TraceRequestExceptionParams,
     TraceRequestStartParams,
-    hdrs,
 )
-from pydantic_core import from_json, to_json
+from prometheus_client import REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from pydantic_core import to_json
 
+from app.config.config import HttpClientConfig
 from app.config.constants import (
     DEFAULT_HTTP_TIMEOUT,
     LOGGING_SENSITIVE_FIELDS,
@@ -22,41 +25,24 @@ from app.config.constants import (
 )
 from app.utils import struct_log
 
+logger = structlog.stdlib.get_logger()
+
 
 async def on_request_start(_: ClientSession, context: SimpleNamespace, params: TraceRequestStartParams) -> None:
     context.method = params.method
     context.url = params.url.human_repr()
-    context.headers = {
-        key: (LOGGING_SENSITIVE_REPLACEMENT if key.lower() in LOGGING_SENSITIVE_FIELDS else value)
-        for key, value in params.headers.items()
-    }
-
-
-async def on_request_end(_: ClientSession, context: SimpleNamespace, params: TraceRequestEndParams) -> None:
-    ctype = params.response.headers.get(hdrs.CONTENT_TYPE, "").lower()
-
-    if ctype == "application/json":
-        response = await params.response.json()
-    else:
-        response = await params.response.text()
 
-    if context.trace_request_ctx["log"]:
-        struct_log(
-            event="Request sent" if params.response.ok else "Request sent, got an error",
-            request_duration=(datetime.utcnow() - context.trace_request_ctx["start_time"]).total_seconds(),
-            request=dict(
-                headers=context.headers,
-                body=getattr(context, "body", ""),
-                method=context.method,
-                url=context.url,
-            ),
-            response=dict(
-                body=response,
-            ),
-        )
+    if not context.trace_request_ctx["log"]:
+        return
 
-    if context.trace_request_ctx["raise"]:
-        params.response.raise_for_status()
+    context.trace_request_ctx["request"] = dict(
+        headers={
+            key: (LOGGING_SENSITIVE_REPLACEMENT if key.lower() in LOGGING_SENSITIVE_FIELDS else value)
+            for key, value in params.headers.items()
+        },
+        method=context.method,
+        url=context.url,
+    )
 
 
 async def on_request_chunk_sent(
@@ -64,10 +50,54 @@ async def on_request_chunk_sent(
     context: SimpleNamespace,
     chunk: TraceRequestChunkSentParams,
 ) -> None:
-    try:
-        context.body = from_json(chunk.chunk)
-    except ValueError:
-        context.body = chunk.chunk.decode("utf-8")
+    ctx = context.trace_request_ctx
+
+    # json payloads are logged from the original object, only raw bodies are captured (up to the limit)
+    if not ctx["log"] or ctx["json"] is not None:
+        return
+
+    sent = ctx.setdefault("sent", bytearray())
+    ctx["sent_size"] = ctx.get("sent_size", 0) + len(chunk.chunk)
+
+    remaining = ctx["body_limit"] - len(sent)
+    if remaining > 0:
+        sent += chunk.chunk[:remaining]
+
+
+def log_request(trace_request_ctx: dict[str, Any], response: ClientResponse, body: bytes | None) -> None:
+    if not trace_request_ctx["log"]:
+        return
+
+    limit = trace_request_ctx["body_limit"]
+    request = trace_request_ctx.get("request", {})
+
+    if trace_request_ctx["json"] is not None:
+        request["body"] = trace_request_ctx["json"]
+    else:
+        request["body"] = _truncate_body(
+            body=bytes(trace_request_ctx.get("sent", b"")),
+            limit=limit,
+            size=trace_request_ctx.get("sent_size", 0),
+        )
+
+    struct_log(
+        event="Request sent" if response.ok else "Request sent, got an error",
+        request_duration=(datetime.utcnow() - trace_request_ctx["start_time"]).total_seconds(),
+        request=request,
+        response=dict(
+            status=response.status,
+            body=_truncate_body(body=body, limit=limit, size=len(body)) if body is not None else "<streamed>",
+        ),
+    )
+
+
+def _truncate_body(body: bytes, limit: int, size: int) -> str:
+    text = body[:limit].decode("utf-8", errors="replace")
+
+    if size > limit:
+        text += f"... ({size - limit} bytes truncated)"
+
+    return text
 
 
 async def on_request_exception(
@@ -83,34 +113,109 @@ async def on_request_exception(
             event="Sending request",
             method=context.method,
             url=context.url,
-            headers=context.headers,
+            headers=context.trace_request_ctx.get("request", {}).get("headers"),
             body=context.trace_request_ctx.get("json") or context.trace_request_ctx.get("data"),
         )
 
     raise detail.exception
 
 
-class AioHttpClient:
-    auth_header: dict[str, str]
-    base_url: str
+class AioHttpPool:
+    """Per-worker ClientSession shared by every AioHttpClient, opened and closed in the app lifespan"""
 
-    def __init__(self, auth_header: dict[str, str], base_url: str):
-        self.auth_header = auth_header
-        self.base_url = base_url
+    def __init__(self, config: HttpClientConfig):
+        self.config = config
+        self._session: ClientSession | None = None
+        self._connector: aiohttp.TCPConnector | None = None
+        self._collector = _PoolCollector(pool=self)
+        self._collector_registered = False
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+
+        return self._session
+
+    async def start(self) -> None:
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+
+        if not self._collector_registered:
+            REGISTRY.register(self._collector)
+            self._collector_registered = True
 
-    @staticmethod
-    def _get_session() -> aiohttp.ClientSession:
+        logger.info("Http pool started", **self.stats())
+
+    async def close(self) -> None:
+        if self._collector_registered:
+            REGISTRY.unregister(self._collector)
+            self._collector_registered = False
+
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+        self._session = None
+        self._connector = None
+
+    def stats(self) -> dict[str, int]:
+        connector = self._connector
+        if connector is None or connector.closed:
+            return dict(in_use=0, idle=0, queued=0)
+
+        return dict(
+            in_use=len(connector._acquired),  # noqa
+            idle=sum(len(conns) for conns in connector._conns.values()),  # noqa
+            queued=sum(len(waiters) for waiters in connector._waiters.values()),  # noqa
+        )
+
+    def _create_session(self) -> ClientSession:
         trace_config = aiohttp.TraceConfig()
         trace_config.on_request_start.append(on_request_start)
         trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
-        trace_config.on_request_end.append(on_request_end)
         trace_config.on_request_exception.append(on_request_exception)
 
+        self._connector = aiohttp.TCPConnector(
+            limit=self.config.HTTP_POOL_LIMIT,
+            limit_per_host=self.config.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=self.config.HTTP_POOL_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=self.config.HTTP_POOL_DNS_CACHE_TTL,
+            ssl=False,
+        )
+
         return aiohttp.ClientSession(
+            connector=self._connector,
             json_serialize=lambda x: to_json(x).decode(),
             trace_configs=[trace_config],
         )
 
+
+class _PoolCollector(Collector):
+    def __init__(self, pool: AioHttpPool):
+        self.pool = pool
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        gauge = GaugeMetricFamily(
+            name="http_client_pool_connections",
+            documentation="Outgoing aiohttp connections of this worker by state",
+            labels=["state"],
+        )
+
+        for state, value in self.pool.stats().items():
+            gauge.add_metric(labels=[state], value=value)
+
+        yield gauge
+
+
+class AioHttpClient:
+    auth_header: dict[str, str]
+    base_url: str
+
+    def __init__(self, auth_header: dict[str, str], base_url: str, pool: AioHttpPool):
+        self.auth_header = auth_header
+        self.base_url = base_url
+        self.pool = pool
+
     async def request(
         self,
         method: str,
@@ -131,27 +236,42 @@ class AioHttpClient:
         if not full_url:
             url = self.base_url + url
 
-        async with self._get_session() as client:
-            response = await client.request(
-                method=method,
-                url=url,
-                timeout=timeout,
-                headers=headers,
-                params=params,
-                json=json,
-                data=data,
-                raise_for_status=False,
-                ssl=False,
-                trace_request_ctx={
-                    "json": json,
-                    "data": data,
-                    "raise": raise_exceptions,
-                    "start_time": datetime.utcnow(),
-                    "log": log,
-                },
-            )
-
-            if return_json:
-                return await response.json()
+        trace_request_ctx = {
+            "json": json,
+            "data": data,
+            "start_time": datetime.utcnow(),
+            "log": log,
+            "body_limit": self.pool.config.HTTP_LOG_BODY_LIMIT,
+        }
+
+        response = await self.pool.session.request(
+            method=method,
+            url=url,
+            timeout=timeout,
+            headers=headers,
+            params=params,
+            json=json,
+            data=data,
+            raise_for_status=False,
+            ssl=False,
+            trace_request_ctx=trace_request_ctx,
+        )
+
+        if not return_json:
+            # the caller reads the body, the connection goes back to the pool once it is consumed
+            log_request(trace_request_ctx=trace_request_ctx, response=response, body=None)
+
+            if raise_exceptions:
+                response.raise_for_status()
 
             return response
+
+        async with response:
+            body = await response.read()
+            log_request(trace_request_ctx=trace_request_ctx, response=response, body=body)
+
+            if raise_exceptions:
+                response.raise_for_status()
+
+            # parses the already buffered body, once
+            return await response.json()
@@ -1,17 +1,18 @@
 import structlog
 
 from app.config.config import Config
-from app.external.base.aiohttp_client import AioHttpClient
+from app.external.base.aiohttp_client import AioHttpClient, AioHttpPool
 
 logger = structlog.stdlib.get_logger()
 
 
 class TelegramClient:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, pool: AioHttpPool):
         self.config = config
         self.http_client = AioHttpClient(
             auth_header={},
             base_url=f"https://api.telegram.org/bot{config.bot.TELEGRAM_BOT_TOKEN}",
+            pool=pool,
         )
 
     async def send_method(self, method: str, params: dict) -> dict:
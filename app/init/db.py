@@ -1,14 +1,47 @@
 import functools
 import json
-from typing import Tuple
+from typing import Awaitable, Callable, Tuple
 
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.config.config import PostgresConfig
+from app.config.constants import (
+    AFTER_COMMIT_INFO_KEY,
+    ON_COMMIT_INFO_KEY,
+)
 from app.init.base_models import DecimalEncoder
 
 
+class Session(AsyncSession):
+    """
+    Awaits the hooks in ``info[AFTER_COMMIT_INFO_KEY]`` once a commit went through,
+    then the callbacks registered with ``on_commit`` for this transaction
+    """
+
+    def on_commit(self, callback: Callable[[], Awaitable]) -> None:
+        """Runs ``callback`` once after the next commit, a rollback drops it"""
+
+        self.info.setdefault(ON_COMMIT_INFO_KEY, []).append(callback)
+
+    async def commit(self) -> None:
+        await super().commit()
+
+        for hook in self.info.get(AFTER_COMMIT_INFO_KEY, ()):
+            await hook(self)
+
+        for callback in self.info.pop(ON_COMMIT_INFO_KEY, ()):
+            await callback()
+
+    async def rollback(self) -> None:
+        self.info.pop(ON_COMMIT_INFO_KEY, None)
+        await super().rollback()
+
+    async def close(self) -> None:
+        self.info.pop(ON_COMMIT_INFO_KEY, None)
+        await super().close()
+
+
 def get_session_factory(config: PostgresConfig) -> Tuple[sessionmaker, AsyncEngine]:
     engine = create_async_engine(
         url=config.dsn,
@@ -21,5 +54,5 @@ def get_session_factory(config: PostgresConfig) -> Tuple[sessionmaker, AsyncEngi
         future=True,
     )
 
-    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)  # noqa
+    session_factory = sessionmaker(bind=engine, class_=Session, expire_on_commit=False)  # noqa
     return session_factory, engine
@@ -18,8 +18,9 @@ def get_app() -> FastAPI:
 
     session_factory, engine = get_session_factory(config=config.postgres)
     adapters = Adapters(config=config)
+    adapters.user_snapshots.attach(session_factory=session_factory)
 
-    fastapi = FastAPI(docs_url=None, redoc_url=None, openapi_url=None, lifespan=adapters.bot.setup)
+    fastapi = FastAPI(docs_url=None, redoc_url=None, openapi_url=None, lifespan=adapters.lifespan)
 
     fastapi = setup_routes(app=fastapi)
     fastapi = setup_dependencies(
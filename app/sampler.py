@@ -0,0 +1,77 @@
+import random
+from typing import Callable, Generic, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+class Sampler(Generic[T]):
+    """
+    Weighted sampler over a fixed population, built once with the alias method: O(n) build, O(1) per draw.
+    Pass ``seed`` for a reproducible stream, otherwise draws use the global ``random`` state
+    """
+
+    def __init__(self, population: Sequence[T], weights: Sequence[float], seed: int | None = None):
+        if len(population) != len(weights):
+            raise ValueError("The number of weights does not match the population")
+
+        total = float(sum(weights))
+        if not population or total <= 0:
+            raise ValueError("Total of weights must be greater than zero")
+
+        self.population = list(population)
+        self.weights = [float(weight) for weight in weights]
+        self.seed = seed
+        self._random = random.Random(seed).random if seed is not None else random.random  # noqa: S311
+        self._prob, self._alias = self._build(weights=self.weights, total=total)
+
+    def __len__(self) -> int:
+        return len(self.population)
+
+    def choose(self) -> T:
+        n = len(self._prob)
+        u = self._random() * n
+        i = int(u)
+
+        # one random number: the integer part picks the column, the fraction decides between it and its alias
+        if u - i < self._prob[i]:
+            return self.population[i]
+
+        return self.population[self._alias[i]]
+
+    def sample(self, k: int) -> list[T]:
+        choose = self.choose
+        return [choose() for _ in range(k)]
+
+    def subset(self, predicate: Callable[[T], bool]) -> "Sampler[T]":
+        """Sampler over the items matching ``predicate``, with their original relative weights"""
+
+        pairs = [(item, weight) for item, weight in zip(self.population, self.weights, strict=True) if predicate(item)]
+        return Sampler(
+            population=[item for item, _ in pairs],
+            weights=[weight for _, weight in pairs],
+            seed=self.seed,
+        )
+
+    @staticmethod
+    def _build(weights: list[float], total: float) -> tuple[list[float], list[int]]:
+        n = len(weights)
+        scaled = [weight * n / total for weight in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+
+        small = [i for i, value in enumerate(scaled) if value < 1]
+        large = [i for i, value in enumerate(scaled) if value >= 1]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+
+        # leftovers are 1 up to float error
+        for i in small + large:
+            prob[i] = 1.0
+
+        return prob, alias
@@ -0,0 +1,229 @@
+"""
+Runs the periodic TaskService jobs in-process, without cron and the HTTP round trip through the API:
+
+    python -m app.scheduler
+    python -m app.scheduler --jobs give_wheel give_offline_rocket
+    python -m app.scheduler --once give_wheel
+
+Runs are aligned to multiples of the job interval (a daily job runs at 00:00 UTC) plus a random jitter.
+Every run takes a redis lease first, so any number of schedulers can be up and each run happens once.
+The lease is renewed while the job runs, a run that outlives its interval makes the next one skip, not overlap.
+"""
+
+import argparse
+import asyncio
+import random
+import signal
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+import structlog
+from prometheus_client import Counter, Histogram, start_http_server
+from sqlalchemy.orm import sessionmaker
+
+from app.adapters.base import Adapters
+from app.adapters.redis import RedisAdapter
+from app.config.config import Config, SchedulerConfig, get_config
+from app.init.db import get_session_factory
+from app.init.logs import setup_logs
+from app.services.task import TaskService
+
+logger = structlog.stdlib.get_logger()
+
+JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds",
+    "Duration of scheduler job runs",
+    ["job", "status"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 120, 300),
+)
+JOB_SKIPPED = Counter("scheduler_job_skipped_total", "Scheduled runs skipped, the lease was held elsewhere", ["job"])
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    interval: float
+    run: Callable[[TaskService], Awaitable[Any]]
+
+
+JOBS = (
+    Job(name="give_offline_rocket", interval=60, run=TaskService.give_offline_rocket),
+    Job(name="send_premium_rocket_notifications", interval=60, run=TaskService.send_premium_rocket_notifications),
+    Job(name="give_wheel", interval=60, run=TaskService.give_wheel),
+    Job(name="populate_gifts_latest", interval=60, run=TaskService.populate_gifts_latest),
+    Job(name="flush_presence", interval=30, run=TaskService.flush_presence),
+    Job(name="reset_richads", interval=24 * 60 * 60, run=TaskService.reset_richads),
+    Job(
+        name="maintain_transaction_partitions",
+        interval=24 * 60 * 60,
+        run=TaskService.maintain_transaction_partitions,
+    ),
+)
+
+
+class Lease:
+    _RENEW = """
+        if redis.call("get", KEYS[1]) ~= ARGV[1] then
+            return 0
+        end
+        if redis.call("pttl", KEYS[1]) < tonumber(ARGV[2]) then
+            redis.call("pexpire", KEYS[1], ARGV[2])
+        end
+        return 1
+    """
+    _RELEASE = """
+        if redis.call("get", KEYS[1]) == ARGV[1] then
+            return redis.call("del", KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, redis: RedisAdapter, key: str):
+        self.redis = redis
+        self.key = key
+        self.token = uuid.uuid4().hex
+
+    async def acquire(self, ttl: float) -> bool:
+        return bool(await self.redis.redis.set(self.key, self.token, nx=True, px=max(int(ttl * 1000), 1)))
+
+    async def renew(self, ttl: float) -> bool:
+        """Keeps the lease for at least ``ttl`` more seconds, False when it is no longer ours"""
+
+        return bool(await self.redis.redis.eval(self._RENEW, 1, self.key, self.token, int(ttl * 1000)))
+
+    async def release(self) -> None:
+        await self.redis.redis.eval(self._RELEASE, 1, self.key, self.token)
+
+
+class Scheduler:
+    def __init__(
+        self,
+        config: SchedulerConfig,
+        adapters: Adapters,
+        session_factory: sessionmaker,
+        jobs: tuple[Job, ...] = JOBS,
+    ):
+        self.config = config
+        self.adapters = adapters
+        self.session_factory = session_factory
+        self.jobs = jobs
+
+    async def run_forever(self) -> None:
+        logger.info(f"Scheduler started: {', '.join(job.name for job in self.jobs)}")
+        await asyncio.gather(*(self._schedule(job) for job in self.jobs))
+
+    async def run_once(self, job: Job) -> None:
+        await self._run(job=job)
+
+    async def _schedule(self, job: Job) -> None:
+        while True:
+            slot_start = (time.time() // job.interval + 1) * job.interval
+            slot_end = slot_start + job.interval
+            await asyncio.sleep(slot_start - time.time() + random.uniform(0, self.config.SCHEDULER_JITTER))  # noqa: S311
+
+            lease = Lease(redis=self.adapters.redis, key=f"scheduler:{job.name}")
+
+            try:
+                acquired = await lease.acquire(ttl=slot_end - time.time())
+            except Exception as e:
+                logger.error(f"Scheduler failed to take the lease of {job.name}: {e}")
+                continue
+
+            if not acquired:
+                JOB_SKIPPED.labels(job=job.name).inc()
+                logger.info(f"Scheduler skipped {job.name}, the lease is held elsewhere")
+                continue
+
+            await self._run(job=job, lease=lease)
+
+            # inside the slot the lease stays, so no other scheduler runs the job again in it
+            if time.time() >= slot_end:
+                try:
+                    await lease.release()
+                except Exception as e:
+                    logger.warning(f"Scheduler failed to release the lease of {job.name}: {e}")
+
+    async def _run(self, job: Job, lease: Lease | None = None) -> None:
+        renewer = asyncio.create_task(self._renew_forever(job=job, lease=lease)) if lease else None
+        started_at = time.monotonic()
+        status = "success"
+
+        try:
+            await job.run(TaskService(adapters=self.adapters, session_factory=self.session_factory))
+        except Exception as e:
+            status = "error"
+            logger.error(
+                event=f"Scheduler job {job.name} failed: {e}",
+                exception=traceback.format_exception(e),
+            )
+        finally:
+            if renewer:
+                renewer.cancel()
+
+            elapsed = time.monotonic() - started_at
+            JOB_DURATION.labels(job=job.name, status=status).observe(elapsed)
+            logger.info(f"Scheduler job {job.name} finished in {elapsed:.2f}s, {status=}")
+
+    async def _renew_forever(self, job: Job, lease: Lease) -> None:
+        ttl = self.config.SCHEDULER_LEASE_TTL
+
+        while True:
+            await asyncio.sleep(ttl / 3)
+
+            try:
+                if not await lease.renew(ttl=ttl):
+                    logger.warning(f"Scheduler lost the lease of {job.name} while running it")
+            except Exception as e:
+                logger.warning(f"Scheduler failed to renew the lease of {job.name}: {e}")
+
+
+async def run(config: Config, jobs: tuple[Job, ...], once: Job | None = None) -> None:
+    session_factory, engine = get_session_factory(config=config.postgres)
+    adapters = Adapters(config=config)
+    adapters.user_snapshots.attach(session_factory=session_factory)
+    scheduler = Scheduler(config=config.scheduler, adapters=adapters, session_factory=session_factory, jobs=jobs)
+
+    current = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, current.cancel)
+
+    try:
+        async with adapters.background():
+            if once:
+                await scheduler.run_once(job=once)
+            else:
+                await scheduler.run_forever()
+    except asyncio.CancelledError:
+        logger.info("Scheduler stopped")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    names = [job.name for job in JOBS]
+
+    parser = argparse.ArgumentParser(description="Periodic jobs scheduler")
+    parser.add_argument("--jobs", nargs="+", choices=names, default=names, help="jobs to schedule, all by default")
+    parser.add_argument("--once", choices=names, default=None, help="run one job right away and exit")
+    args = parser.parse_args()
+
+    config = get_config()
+    setup_logs(config=config.logs)
+
+    if config.scheduler.SCHEDULER_METRICS_PORT and not args.once:
+        start_http_server(port=config.scheduler.SCHEDULER_METRICS_PORT)
+
+    by_name = {job.name: job for job in JOBS}
+    asyncio.run(
+        run(
+            config=config,
+            jobs=tuple(by_name[name] for name in args.jobs),
+            once=by_name[args.once] if args.once else None,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
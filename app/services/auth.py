@@ -42,6 +42,18 @@ class AuthService(BaseService):
 
     @staticmethod
     def auth_webapp(webapp_data: str, adapters: Adapters) -> WebappData:
+        cache_key = hashlib.sha256(webapp_data.encode()).digest()
+        cached = adapters.webapp_cache.get(cache_key)
+
+        if cached is None:
+            cached, expires_in = AuthService._verify_webapp(webapp_data=webapp_data, adapters=adapters)
+            adapters.webapp_cache.set(cache_key, cached, ttl=min(adapters.webapp_cache.ttl, expires_in))
+
+        # callers mutate the result (e.g. country), never hand out the cached instance
+        return cached.model_copy()
+
+    @staticmethod
+    def _verify_webapp(webapp_data: str, adapters: Adapters) -> tuple[WebappData, float]:
         parsed_data = dict(parse_qsl(webapp_data))
 
         try:
@@ -50,7 +62,8 @@ class AuthService(BaseService):
         except KeyError:
             raise ClientError(message="invalid webapp data", status_code=status.HTTP_401_UNAUTHORIZED)
 
-        if datetime.utcnow() > max_auth_date:
+        expires_in = (max_auth_date - datetime.utcnow()).total_seconds()
+        if expires_in < 0:
             raise ClientError(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 message="auth_date is too old",
@@ -59,14 +72,8 @@ class AuthService(BaseService):
         sorted_data = sorted(parsed_data.items(), key=itemgetter(0))
         data_check_string = "\n".join(f"{k}={v}" for k, v in sorted_data)
 
-        secret_key = hmac.new(
-            key=b"WebAppData",
-            msg=adapters.config.bot.TELEGRAM_BOT_TOKEN.encode(),
-            digestmod=hashlib.sha256,
-        )
-
         actual_hash = hmac.new(
-            key=secret_key.digest(),
+            key=adapters.webapp_secret_key,
             msg=data_check_string.encode(),
             digestmod=hashlib.sha256,
         ).hexdigest()
@@ -81,7 +88,7 @@ class AuthService(BaseService):
 
         user_data = json.loads(parsed_data["user"])
 
-        return WebappData(
+        webapp = WebappData(
             telegram_id=user_data["id"],
             language_code=user_data.get("language_code"),
             first_name=user_data.get("first_name"),
@@ -91,3 +98,4 @@ class AuthService(BaseService):
             start_param=parsed_data.get("start_param"),
             photo_url=user_data.get("photo_url"),
         )
+        return webapp, expires_in
@@ -1,4 +1,3 @@
-import asyncio
 import traceback
 from typing import Callable, Type, TypeVar
 
@@ -73,12 +72,10 @@ class BaseService:
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
 
-                asyncio.create_task(
-                    args[0].adapters.alerts.handle_alert(
-                        response=None,
-                        total_time=0,
-                        exception=e,
-                    )
+                args[0].adapters.alerts.handle_alert(
+                    response=None,
+                    total_time=0,
+                    exception=e,
                 )
 
                 raise e
@@ -43,6 +43,7 @@ class BotService(BaseService):
     async def gift_withdrawn(self, callback: CallbackQuery, gift_id: int) -> None:
         gift = await self.repo.get_gift_for_update(gift_user_id=gift_id)
         await self.repo.update_gift_user(gift_user_id=gift.id, status=GiftUserStatusEnum.withdrawn)
+        self.services.game.discard_latest_gift(gift_user_id=gift.id)
 
         await self.adapters.bot.edit_message_text(
             chat_id=callback.message.chat.id,
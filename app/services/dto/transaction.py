@@ -5,3 +5,8 @@ from app.init.base_models import BaseModel
 class ChangeUserBalanceDTO(BaseModel):
     user: User
     transaction: Transaction
+
+
+class ChangeUserBalancesDTO(BaseModel):
+    user: User
+    transactions: list[Transaction]
@@ -8,6 +8,7 @@ class WsEventsEnum(str, Enum):
     purchase = "purchase"
     roll_purchase = "roll_purchase"
     gift_withdrawal = "gift_withdrawal"
+    broadcast = "broadcast"
 
 
 class WSMessage(BaseModel):
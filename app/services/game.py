@@ -1,22 +1,31 @@
+import functools
 import random
+import time
+from datetime import UTC
 from decimal import Decimal
-from typing import Annotated
+from typing import Annotated, Sequence
 
 import structlog
 from fastapi.params import Depends
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from app.adapters.base import Adapters
+from app.adapters.bets_config import BetsTable
+from app.adapters.response_cache import CachedResponse
 from app.api.dependencies.stubs import (
     dependency_adapters,
     dependency_session_factory,
     placeholder,
 )
 from app.api.dto.game.request import MakeBetRequest
+from app.api.dto.game.response import BetConfigResponse
+from app.api.dto.game.response import LatestGiftResponse
 from app.api.dto.game.response import MakeBetResponse
 from app.api.dto.game.response import (
     WHEEL_PRIZES,
+    LatestWheelPrizeResponse,
     LaunchResponse,
     WheelPrizeEnum,
     WheelPrizeResponse,
@@ -24,8 +33,13 @@ from app.api.dto.game.response import (
 from app.api.dto.user.response import RocketResponse
 from app.api.dto.user.response import UserResponse
 from app.api.exceptions import ClientError
+from app.config.constants import BETS_CONFIG_RESPONSE_KEY
 from app.config.constants import FUEL_CAPACITY_MAP
+from app.config.constants import LATEST_GIFTS_FEED_KEY
+from app.config.constants import LATEST_GIFTS_RESPONSE_KEY
 from app.config.constants import MAX_BALANCE
+from app.config.constants import WHEEL_WINNERS_FEED_KEY
+from app.config.constants import WHEEL_WINNERS_RESPONSE_KEY
 from app.db.models import BetConfig
 from app.db.models import Gift
 from app.db.models import GiftUser
@@ -39,10 +53,20 @@ from app.db.models import (
 )
 from app.db.models import Rocket
 from app.services.base.base import BaseService
+from app.sampler import Sampler
 from app.services.dto.auth import WebappData
 
 logger = structlog.stdlib.get_logger()
 
+BALANCE_PRIZES = (WheelPrizeEnum.usdt, WheelPrizeEnum.ton)
+WHEEL_SAMPLER = Sampler(population=WHEEL_PRIZES, weights=[prize.chance for prize in WHEEL_PRIZES])
+WHEEL_SAMPLER_NO_BALANCE = WHEEL_SAMPLER.subset(lambda prize: prize.type not in BALANCE_PRIZES)
+# reversed, so the first prize wins on duplicate (type, amount)
+WHEEL_PRIZES_BY_KEY = {(prize.type, prize.amount): prize for prize in reversed(WHEEL_PRIZES)}
+
+WHEEL_WINNERS_ADAPTER = TypeAdapter(list[LatestWheelPrizeResponse])
+LATEST_GIFTS_ADAPTER = TypeAdapter(list[LatestGiftResponse])
+
 
 class GameService(BaseService):
     def __init__(
@@ -76,42 +100,116 @@ class GameService(BaseService):
         await self.session.refresh(gift)
         return gift
 
+    async def _load_bets_config(self) -> Sequence[BetConfig]:
+        configs = await self.repo.get_bets_config()
+
+        # the rows outlive this session in the per-worker cache, a rollback here must not expire them
+        for config in configs:
+            self.session.expunge(config)
+            if config.collection is not None and config.collection in self.session:
+                self.session.expunge(config.collection)
+
+        return configs
+
+    async def get_bets_tables(self) -> dict[float, BetsTable]:
+        return await self.adapters.bets_config.get(loader=self._load_bets_config)
+
     @BaseService.single_transaction
-    async def get_bets_config(self) -> dict[list[BetConfig]]:
-        return await self.repo.get_bets_config()
+    async def get_bets_config(self) -> dict[float, list[BetConfig]]:
+        tables = await self.get_bets_tables()
+        return {bet_from: table.configs for bet_from, table in tables.items()}
+
+    async def get_bets_config_response(self) -> CachedResponse:
+        return await self.adapters.response_cache.get(
+            key=BETS_CONFIG_RESPONSE_KEY,
+            ttl=self.adapters.config.cache.CACHE_BETS_CONFIG_TTL,
+            build=self._dump_bets_config,
+        )
+
+    async def _dump_bets_config(self) -> bytes:
+        resp = BetConfigResponse.model_validate(await self.get_bets_config(), from_attributes=True)
+        return resp.model_dump_json(by_alias=True).encode()
 
     @BaseService.single_transaction
     async def get_gifts(self, current_user: WebappData) -> list[GiftUser]:
         return await self.repo.get_user_gifts(user_id=current_user.telegram_id)
 
+    async def get_latest_gifts(self) -> list[dict | Gift]:
+        feed = self.adapters.activity_feed
+        gifts = await feed.recent(key=LATEST_GIFTS_FEED_KEY, limit=self.adapters.config.feed.FEED_LATEST_GIFTS_LIMIT)
+        if gifts is not None:
+            return gifts
+
+        gift_users = await self._get_latest_gifts_from_db()
+        await feed.push(key=LATEST_GIFTS_FEED_KEY, entries=[self._latest_gift_entry(i, i.gift) for i in gift_users])
+        return [i.gift for i in gift_users]
+
     @BaseService.single_transaction
-    async def get_latest_gifts(self) -> list[Gift]:
-        resp = await self.repo.get_latest_gifts()
-        return [i.gift for i in resp]
+    async def _get_latest_gifts_from_db(self) -> Sequence[GiftUser]:
+        return await self.repo.get_latest_gifts()
+
+    def push_latest_gifts(self, gift_users: list[tuple[GiftUser, Gift]]) -> None:
+        # the feed changes only once the rows are committed, a rolled back insert never shows up
+        self.session.on_commit(
+            functools.partial(
+                self.adapters.activity_feed.push,
+                key=LATEST_GIFTS_FEED_KEY,
+                entries=[self._latest_gift_entry(gift_user, gift) for gift_user, gift in gift_users],
+            )
+        )
+
+    def discard_latest_gift(self, gift_user_id: int) -> None:
+        self.session.on_commit(
+            functools.partial(
+                self.adapters.activity_feed.discard,
+                key=LATEST_GIFTS_FEED_KEY,
+                predicate=lambda entry: entry["id"] == gift_user_id,
+            )
+        )
+
+    @staticmethod
+    def _latest_gift_entry(gift_user: GiftUser, gift: Gift) -> tuple[float, dict]:
+        entry = dict(
+            id=gift_user.id,
+            gift_id=gift.gift_id,
+            gift_id_ton=gift.gift_id_ton,
+            image=gift.image,
+            meta=gift.meta,
+            collection=dict(id=gift.collection.id, name=gift.collection.name, image=gift.collection.image),
+        )
+        return gift_user.created_at.replace(tzinfo=UTC).timestamp(), entry
+
+    async def get_latest_gifts_response(self) -> CachedResponse:
+        return await self.adapters.response_cache.get(
+            key=LATEST_GIFTS_RESPONSE_KEY,
+            ttl=self.adapters.config.cache.CACHE_LATEST_GIFTS_TTL,
+            build=self._dump_latest_gifts,
+        )
+
+    async def _dump_latest_gifts(self) -> bytes:
+        gifts = LATEST_GIFTS_ADAPTER.validate_python(await self.get_latest_gifts(), from_attributes=True)
+        return LATEST_GIFTS_ADAPTER.dump_json(gifts, by_alias=True)
 
     @BaseService.single_transaction
     async def make_bet(self, data: MakeBetRequest, current_user: WebappData) -> MakeBetResponse:
-        user = await self.repos.user.get_user_for_update(telegram_id=current_user.telegram_id)
-        new_rolls = user.rolls_dict
-        new_rolls[data.amount] = new_rolls.get(data.amount, 0) - 1
+        table = (await self.get_bets_tables()).get(float(data.amount))
+        if not table:
+            raise ClientError(message="No gifts configured for this bet")
 
-        if new_rolls[data.amount] < 0:
+        user = await self.repos.user.change_rolls(
+            telegram_id=current_user.telegram_id,
+            amount=data.amount,
+            count=-1,
+            use_boost=True,
+        )
+
+        if not user:
             raise ClientError(message="Not enough rolls for this bet")
 
         roll = await self.repos.transaction.create_roll(user_id=user.telegram_id, ton_amount=data.amount)
-        await self.repos.user.update_user(
-            telegram_id=user.telegram_id,
-            rolls=new_rolls,
-            boost_balance=max(user.boost_balance - 1, 0),
-        )
         await self.session.flush()
-        await self.session.refresh(user)
 
-        gifts_options = await self.repo.get_bets_config_amount(amount=data.amount)
-        gift_option = random.choices(
-            population=gifts_options,
-            weights=[float(gift.actual_probability) for gift in gifts_options],
-        )[0]
+        gift_option = table.choose()
 
         if not gift_option.is_boost:
             await self.repo.create_gift_user(
@@ -131,60 +229,97 @@ class GameService(BaseService):
 
         return MakeBetResponse(user=user, collection=gift_option.collection, bet_config_id=gift_option.id)
 
-    @BaseService.single_transaction
-    async def get_latest_wheel_winners(self) -> list[WheelPrize]:
-        return await self.repo.get_wheel_winners()
+    async def get_latest_wheel_winners(self) -> list[dict | WheelPrize]:
+        config = self.adapters.config.feed
+        feed = self.adapters.activity_feed
+
+        winners = await feed.recent(
+            key=WHEEL_WINNERS_FEED_KEY,
+            limit=config.FEED_SIZE,
+            since=time.time() - config.FEED_WHEEL_WINNERS_WINDOW,
+        )
+        if winners is not None:
+            return winners
+
+        winners = await self._get_latest_wheel_winners_from_db()
+        await feed.push(key=WHEEL_WINNERS_FEED_KEY, entries=[self._wheel_winner_entry(i, i.user) for i in winners])
+        return winners
 
     @BaseService.single_transaction
-    async def spin_wheel(self, current_user: WebappData) -> WheelPrizeResponse:
-        balance_data = await self.services.transaction.change_user_balance(
-            telegram_id=current_user.telegram_id,
-            currency=CurrenciesEnum.wheel,
-            amount=-1,
-            tx_type=TransactionTypeEnum.wheel_spin,
+    async def _get_latest_wheel_winners_from_db(self) -> Sequence[WheelPrize]:
+        config = self.adapters.config.feed
+        return await self.repo.get_wheel_winners(window=config.FEED_WHEEL_WINNERS_WINDOW, limit=config.FEED_SIZE)
+
+    @staticmethod
+    def _wheel_winner_entry(prize: WheelPrize, user: User) -> tuple[float, dict]:
+        entry = dict(
+            id=prize.id,
+            type=prize.type,
+            amount=float(prize.amount) if prize.amount is not None else None,
+            icon=prize.icon,
+            user=dict(
+                tg_username=user.tg_username,
+                tg_first_name=user.tg_first_name,
+                tg_last_name=user.tg_last_name,
+                tg_photo_url=user.tg_photo_url,
+                tg_is_premium=user.tg_is_premium,
+            ),
         )
+        return prize.created_at.replace(tzinfo=UTC).timestamp(), entry
 
-        user = balance_data.user
+    async def get_latest_wheel_winners_response(self) -> CachedResponse:
+        return await self.adapters.response_cache.get(
+            key=WHEEL_WINNERS_RESPONSE_KEY,
+            ttl=self.adapters.config.cache.CACHE_WHEEL_WINNERS_TTL,
+            build=self._dump_latest_wheel_winners,
+        )
+
+    async def _dump_latest_wheel_winners(self) -> bytes:
+        winners = WHEEL_WINNERS_ADAPTER.validate_python(await self.get_latest_wheel_winners(), from_attributes=True)
+        return WHEEL_WINNERS_ADAPTER.dump_json(winners, by_alias=True)
+
+    @BaseService.single_transaction
+    async def spin_wheel(self, current_user: WebappData) -> WheelPrizeResponse:
+        # locked until commit: the prize overrides and the new spin_count are decided from this read
+        user = await self.repos.user.get_user_for_update(telegram_id=current_user.telegram_id)
         rocket = None
         currencies = (WheelPrizeEnum.token, WheelPrizeEnum.usdt, WheelPrizeEnum.ton, WheelPrizeEnum.wheel)
-        balance_currencies = (WheelPrizeEnum.usdt, WheelPrizeEnum.ton)
 
-        prize = random.choices(
-            population=WHEEL_PRIZES,
-            weights=[prize.chance for prize in WHEEL_PRIZES],
-            k=1,
-        )[0]
+        prize = WHEEL_SAMPLER.choose()
+
+        if prize.type in BALANCE_PRIZES and getattr(user, f"{prize.type.value}_balance") > (MAX_BALANCE - 10):
+            logger.info("Scamming user!")
+            prize = WHEEL_SAMPLER_NO_BALANCE.choose()
+
+        if user.spin_count == 0:
+            prize = WHEEL_PRIZES_BY_KEY.get((WheelPrizeEnum.ton, 1), prize)
+        elif user.spin_count == 2:
+            prize = WHEEL_PRIZES_BY_KEY.get((WheelPrizeEnum.usdt, 1), prize)
 
-        if prize.type in balance_currencies:
-            if getattr(user, f"{prize.type.value}_balance") > (MAX_BALANCE - 10):
-                logger.info("Scamming user!")
-                prize = random.choices(  # noqa: S311
-                    population=[i for i in WHEEL_PRIZES if i.type not in balance_currencies],
-                    weights=[prize.chance for prize in WHEEL_PRIZES if prize.type not in balance_currencies],
-                    k=1,
-                )[0]
-
-        try:
-            if balance_data.user.spin_count == 0:
-                prize = [i for i in WHEEL_PRIZES if i.type == WheelPrizeEnum.ton and i.amount == 1][0]
-            elif balance_data.user.spin_count == 2:
-                prize = [i for i in WHEEL_PRIZES if i.type == WheelPrizeEnum.usdt and i.amount == 1][0]
-        except IndexError:
-            logger.error(f"First spin for 1 ton not found: {WHEEL_PRIZES=}")
+        # WHEEL_PRIZES entries are shared, the response gets its own copy
+        prize = prize.model_copy()
+
+        amounts = [(CurrenciesEnum.wheel, -1)]
 
         if prize.type in currencies:
-            _resp = await self.services.transaction.change_user_balance(
-                telegram_id=current_user.telegram_id,
-                currency=CurrenciesEnum[prize.type.value],
-                amount=prize.amount,
-                tx_type=TransactionTypeEnum.wheel_spin,
-            )
-            user = _resp.user
-        elif prize.type in (
+            amounts.append((CurrenciesEnum[prize.type.value], prize.amount))
+        elif prize.type not in (
             WheelPrizeEnum.default_rocket,
             WheelPrizeEnum.offline_rocket,
             WheelPrizeEnum.premium_rocket,
         ):
+            raise NotImplementedError(f"Prize type {prize.type} is not implemented")
+
+        # the spin debit, the prize credit and the spin counter go in one locked update
+        balance_data = await self.services.transaction.change_user_balances(
+            telegram_id=current_user.telegram_id,
+            amounts=amounts,
+            tx_type=TransactionTypeEnum.wheel_spin,
+            user_kwargs=dict(spin_count=user.spin_count + 1),
+        )
+        user = balance_data.user
+
+        if prize.type not in currencies:
             rocket_type = RocketTypeEnum[prize.type.value.replace("_rocket", "")]
             rocket = await self.repos.user.create_user_rocket(
                 user_id=current_user.telegram_id,
@@ -194,18 +329,24 @@ class GameService(BaseService):
                 seen=True,
             )
             user.rockets.append(rocket)
-        else:
-            raise NotImplementedError(f"Prize type {prize.type} is not implemented")
-
-        await self.repos.user.update_user(telegram_id=current_user.telegram_id, spin_count=user.spin_count + 1)
 
-        await self.repo.create_prize(
+        winner = await self.repo.create_prize(
             user_id=current_user.telegram_id,
             type=prize.type,
             amount=prize.amount,
             icon=prize.icon,
         )
 
+        # ids for the feed entry and the new rocket in the response, the entry is pushed once the spin is committed
+        await self.session.flush()
+        self.session.on_commit(
+            functools.partial(
+                self.adapters.activity_feed.push,
+                key=WHEEL_WINNERS_FEED_KEY,
+                entries=[self._wheel_winner_entry(prize=winner, user=user)],
+            )
+        )
+
         prize.user = UserResponse.model_validate(user)
         prize.rocket = RocketResponse.model_validate(rocket) if rocket else None
         return prize
@@ -300,24 +441,33 @@ class GameService(BaseService):
             tx_type=TransactionTypeEnum.rocket_launch,
         )
 
-        await self.repo.update_rocket(rocket_id=rocket.id, transaction_id=tx_data.transaction.id)
+        await self.repo.update_rocket(
+            rocket_id=rocket.id,
+            transaction_id=tx_data.transaction.id,
+            enabled=False,
+            current_fuel=0,
+        )
         return LaunchResponse(**{currency.value: balance_diff})
 
     async def _handle_premium_rocket(self, user: User, rocket: Rocket) -> LaunchResponse:
-        resp = dict()
+        amounts = [
+            (currency, self.get_balance_diff(user=user, currency=currency, rocket_type=rocket.type))
+            for currency in (CurrenciesEnum.usdt, CurrenciesEnum.token, CurrenciesEnum.ton)
+        ]
 
-        for currency in (CurrenciesEnum.usdt, CurrenciesEnum.token, CurrenciesEnum.ton):
-            balance_diff = self.get_balance_diff(user=user, currency=currency, rocket_type=rocket.type)
-            tx_data = await self.services.transaction.change_user_balance(
-                telegram_id=user.telegram_id,
-                currency=currency,
-                amount=balance_diff,
-                tx_type=TransactionTypeEnum.rocket_launch,
-            )
-            await self.repo.update_rocket(rocket_id=rocket.id, transaction_id=tx_data.transaction.id)
-            resp[currency.value] = balance_diff
+        tx_data = await self.services.transaction.change_user_balances(
+            telegram_id=user.telegram_id,
+            amounts=amounts,
+            tx_type=TransactionTypeEnum.rocket_launch,
+        )
 
-        return LaunchResponse(**resp)
+        await self.repo.update_rocket(
+            rocket_id=rocket.id,
+            transaction_id=tx_data.transactions[-1].id,
+            enabled=False,
+            current_fuel=0,
+        )
+        return LaunchResponse(**{currency.value: amount for currency, amount in amounts})
 
     @BaseService.single_transaction
     async def launch_rocket(self, current_user: WebappData, rocket_id: int) -> LaunchResponse:
@@ -339,7 +489,6 @@ class GameService(BaseService):
         else:
             resp = await self._handle_regular_rocket(user=user, rocket=rocket)
 
-        await self.repo.update_rocket(rocket_id=rocket.id, enabled=False, current_fuel=0)
         await self.session.commit()
         await self.session.refresh(user)
 
@@ -1,4 +1,3 @@
-import asyncio
 import base64
 import traceback
 from typing import Annotated
@@ -22,7 +21,7 @@ from app.api.dependencies.stubs import (
 from app.api.dto.game.response import GiftUserWithdrawResponse
 from app.api.dto.shop.request import SHOP_ITEMS, ShopItem
 from app.api.dto.shop.response import UrlResponse
-from app.api.dto.user.response import UserResponse
+from app.api.dto.user.response import user_payload
 from app.api.exceptions import ClientError
 from app.db.models import (
     CurrenciesEnum,
@@ -91,10 +90,11 @@ class ShopService(BaseService):
             )
             rocket_id = _rocket.id
         elif item.item == WheelPrizeEnum.rolls:
-            user = await self.repos.user.get_user_for_update(telegram_id=data.telegram_id)
-            new_rolls = user.rolls_dict
-            new_rolls[item_price] = (new_rolls.get(item_price, 0) + item.amount) * data.item_amount
-            await self.repos.user.update_user(telegram_id=data.telegram_id, rolls=new_rolls)
+            await self.repos.user.change_rolls(
+                telegram_id=data.telegram_id,
+                amount=item_price,
+                count=item.amount * data.item_amount,
+            )
         elif item.item == WheelPrizeEnum.gift_withdrawal:
             gift = await self.repos.game.get_gift_for_update(gift_user_id=data.gift_id)
             await self.repos.game.update_gift_user(gift_user_id=gift.id, status=GiftUserStatusEnum.paid)
@@ -152,23 +152,21 @@ class ShopService(BaseService):
         async with self.repo.transaction():
             user = await self.repos.user.get_user_by_telegram_id(telegram_id=data.telegram_id)
 
-        asyncio.create_task(
-            self.adapters.alerts.send_alert(
-                message=(
-                    f"Покупочка!!\n\n"
-                    f"Пользователь: {data.telegram_id}\n"
-                    f"Сумма: {data.usd_amount} USD\n"
-                    f"Сумма: {data.amount} {data.currency.upper()}\n"
-                ),
-                chat_id=-1002726537985,
-            )
+        await self.adapters.alerts.send_alert(
+            message=(
+                f"Покупочка!!\n\n"
+                f"Пользователь: {data.telegram_id}\n"
+                f"Сумма: {data.usd_amount} USD\n"
+                f"Сумма: {data.amount} {data.currency.upper()}\n"
+            ),
+            chat_id=-1002726537985,
         )
 
         await self.services.websocket.publish(
             message=WSMessage(
                 event=WsEventsEnum.roll_purchase,
                 telegram_id=user.telegram_id,
-                message=dict(user=UserResponse.model_validate(user).model_dump(by_alias=True)),
+                message=dict(user=user_payload(user=user)),
             )
         )
 
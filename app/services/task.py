@@ -1,12 +1,16 @@
+import itertools
+import json
 import random
+import time
 import traceback
 from collections import defaultdict
 from datetime import UTC
 from datetime import datetime, timedelta
-from typing import Annotated
+from typing import Annotated, Iterable, Sequence
 
 import structlog
 from fastapi.params import Depends
+from sqlalchemy import Row
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
@@ -20,7 +24,11 @@ from app.api.dependencies.stubs import (
     dependency_session_factory,
     placeholder,
 )
+from app.config.constants import ACTIVE_USERS_WINDOW
+from app.config.constants import BETS_CONFIG_RESPONSE_KEY
 from app.config.constants import FUEL_CAPACITY_MAP
+from app.config.constants import NOTIFICATIONS_BATCH_SIZE
+from app.config.constants import PREMIUM_ROCKET_NOTIFICATIONS_KEY
 from app.config.constants import (
     ROCKET_CAPACITY_DEFAULT,
     ROCKET_CAPACITY_OFFLINE,
@@ -29,17 +37,44 @@ from app.config.constants import (
     ROCKET_TIMEOUT_OFFLINE,
     ROCKET_TIMEOUT_PREMIUM,
 )
+from app.config.constants import TASK_CHUNK_SIZE
+from app.config.constants import TASK_TIME_BUDGET
 from app.config.constants import TON_PRICE
+from app.config.constants import TRANSACTIONS_PARTITION_NAME
 from app.config.constants import WHEEL_TIMEOUT
 from app.db.models import CurrenciesEnum, RocketTypeEnum, User
 from app.db.models import Gift
 from app.db.models import GiftStatusEnum
 from app.db.models import GiftUserStatusEnum
 from app.db.models import TransactionTypeEnum
+from app.db.repos.task import Cursor
 from app.services.base.base import BaseService
 
 logger = structlog.stdlib.get_logger()
 
+GRANTED_ROCKETS = (
+    dict(
+        type=RocketTypeEnum.default,
+        fuel_capacity=ROCKET_CAPACITY_DEFAULT,
+        timeout=ROCKET_TIMEOUT_DEFAULT,
+    ),
+    dict(
+        type=RocketTypeEnum.offline,
+        fuel_capacity=ROCKET_CAPACITY_OFFLINE,
+        timeout=ROCKET_TIMEOUT_OFFLINE,
+    ),
+    dict(
+        type=RocketTypeEnum.premium,
+        fuel_capacity=ROCKET_CAPACITY_PREMIUM,
+        timeout=ROCKET_TIMEOUT_PREMIUM,
+    ),
+)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.month - 1 + months
+    return month.replace(year=month.year + index // 12, month=index % 12 + 1, day=1)
+
 
 class TaskService(BaseService):
     def __init__(
@@ -61,6 +96,111 @@ class TaskService(BaseService):
     async def reset_richads(self) -> None:
         return await self.repo.reset_richads()
 
+    async def flush_presence(self) -> None:
+        started_at = time.monotonic()
+        users_count = 0
+
+        while time.monotonic() - started_at < TASK_TIME_BUDGET:
+            entries = await self.adapters.presence.pending(count=TASK_CHUNK_SIZE)
+            if not entries:
+                break
+
+            try:
+                async with self.repo.transaction() as t:
+                    await self.repos.user.set_last_online(entries=entries)
+                    await t.commit()
+            except Exception as e:
+                # the entries stay pending and are written by the next flush
+                logger.error(
+                    event=f"Failed to flush presence of {len(entries)} users: {e}",
+                    exception=traceback.format_exception(e),
+                )
+                break
+
+            await self.adapters.presence.ack(entries=entries)
+            users_count += len(entries)
+
+        logger.info(f"Presence of {users_count} users flushed in {time.monotonic() - started_at:.2f}s")
+
+        await self.adapters.presence.trim()
+        if not await self.adapters.presence.is_seeded():
+            await self._seed_active_users()
+
+    async def maintain_transaction_partitions(self) -> None:
+        """
+        Creates the ledger partitions of the current and the coming months, and detaches the ones past retention.
+        Detached partitions stay as standalone tables to be archived and dropped outside the app
+        """
+
+        config = self.adapters.config.ledger
+        month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        async with self.repo.transaction():
+            partitions = await self.repos.transaction.get_partitions()
+
+        ranges = [(p.start or datetime.min, p.end or datetime.max) for p in partitions if not p.default]
+
+        for offset in range(config.LEDGER_PARTITIONS_AHEAD + 1):
+            start, end = _add_months(month=month, months=offset), _add_months(month=month, months=offset + 1)
+            if any(start < range_end and range_start < end for range_start, range_end in ranges):
+                continue
+
+            name = TRANSACTIONS_PARTITION_NAME.format(year=start.year, month=start.month)
+
+            try:
+                async with self.repo.transaction() as t:
+                    await self.repos.transaction.set_lock_timeout(seconds=config.LEDGER_LOCK_TIMEOUT)
+                    await self.repos.transaction.create_partition(name=name, start=start, end=end)
+                    await t.commit()
+            except Exception as e:
+                # also fails when the default partition already holds rows of the month, they have to be moved by hand
+                logger.error(
+                    event=f"Failed to create ledger partition {name}: {e}",
+                    exception=traceback.format_exception(e),
+                )
+                continue
+
+            logger.info(f"Ledger partition {name} created for {start:%Y-%m}")
+
+        cutoff = _add_months(month=month, months=-config.LEDGER_RETENTION_MONTHS)
+
+        for partition in partitions:
+            if partition.default or partition.end is None or partition.end > cutoff:
+                continue
+
+            try:
+                async with self.repo.transaction() as t:
+                    await self.repos.transaction.set_lock_timeout(seconds=config.LEDGER_LOCK_TIMEOUT)
+                    await self.repos.transaction.detach_partition(name=partition.name)
+                    await t.commit()
+            except Exception as e:
+                logger.error(
+                    event=f"Failed to detach ledger partition {partition.name}: {e}",
+                    exception=traceback.format_exception(e),
+                )
+                continue
+
+            logger.info(f"Ledger partition {partition.name} detached, rows before {partition.end} are archived")
+
+    async def _seed_active_users(self) -> None:
+        """Fills the active users set from users.last_online, after a redis restart or the first deploy"""
+
+        after, users_count = None, 0
+
+        while True:
+            async with self.repo.transaction():
+                users = await self.repo.get_active_users(after=after, limit=TASK_CHUNK_SIZE)
+
+            if not users:
+                break
+
+            await self.adapters.presence.seed(entries=[(user.telegram_id, user.last_online) for user in users])
+            after = (users[-1].last_online, users[-1].id)
+            users_count += len(users)
+
+        await self.adapters.presence.mark_seeded()
+        logger.info(f"Active users seeded with {users_count} users")
+
     @BaseService.single_transaction
     async def _insert_gift(self, gift: dict) -> None:
         date = gift['date']
@@ -171,41 +311,29 @@ class TaskService(BaseService):
             current_fuel=fuel_capacity if full else 0,
         )
 
-    async def grant_rocket(self, user: User) -> None:
-        rockets_data = [
-            dict(
-                type=RocketTypeEnum.default,
-                fuel_capacity=ROCKET_CAPACITY_DEFAULT,
-                timeout=ROCKET_TIMEOUT_DEFAULT,
-            ),
-            dict(
-                type=RocketTypeEnum.offline,
-                fuel_capacity=ROCKET_CAPACITY_OFFLINE,
-                timeout=ROCKET_TIMEOUT_OFFLINE,
-            ),
-            dict(
-                type=RocketTypeEnum.premium,
-                fuel_capacity=ROCKET_CAPACITY_PREMIUM,
-                timeout=ROCKET_TIMEOUT_PREMIUM,
-            ),
-        ]
+    @staticmethod
+    def due_rockets(user: User) -> list[dict]:
+        """Granted rockets the user has none of and is allowed to receive again"""
 
         existing_rockets = {rocket.type for rocket in user.rockets}
 
-        if {i["type"].value for i in rockets_data}.issubset(existing_rockets):
+        return [
+            rocket
+            for rocket in GRANTED_ROCKETS
+            if rocket["type"].value not in existing_rockets
+            and getattr(user, f"next_{rocket['type'].value}_rocket_at") <= datetime.utcnow()
+        ]
+
+    async def grant_rocket(self, user: User) -> None:
+        rockets_data = self.due_rockets(user=user)
+
+        if not rockets_data:
             return
 
         given_rockets = list()
 
         async with self.repo.transaction() as t:
             for rocket in rockets_data:
-                if rocket["type"].value in existing_rockets:
-                    continue
-
-                next_receive = getattr(user, f"next_{rocket['type'].value}_rocket_at")
-                if next_receive > datetime.utcnow():
-                    continue
-
                 logger.info(f"Giving {rocket['type'].value} rocket to user {user.telegram_id}")
 
                 await self.repos.user.create_user_rocket(
@@ -239,20 +367,117 @@ class TaskService(BaseService):
 
         return False
 
+    async def _active_chunks(self, window: float) -> Iterable[list[int] | None]:
+        """
+        Chunks of the users seen in the last ``window`` seconds, from the presence set.
+        When the set is unavailable the chunks are endless None, and the queries walk users.last_online instead
+        """
+
+        active = await self.adapters.presence.active(since=time.time() - window)
+        if active is None:
+            logger.warning("Active users are unavailable, scanning the users table")
+            return itertools.repeat(None)
+
+        return [active[i:i + TASK_CHUNK_SIZE] for i in range(0, len(active), TASK_CHUNK_SIZE)]
+
     async def give_offline_rocket(self) -> None:
-        async with self.repo.transaction():
-            users = await self.repo.get_offline_rocket_users()
+        started_at = time.monotonic()
+        after, users_count, rockets_count = None, 0, 0
+
+        for telegram_ids in await self._active_chunks(window=ACTIVE_USERS_WINDOW):
+            if time.monotonic() - started_at >= TASK_TIME_BUDGET:
+                break
+
+            users = []
+
+            try:
+                async with self.repo.transaction() as t:
+                    users = await self.repo.get_offline_rocket_users(
+                        after=after,
+                        limit=TASK_CHUNK_SIZE,
+                        telegram_ids=telegram_ids,
+                    )
+                    if not users and telegram_ids is None:
+                        break
+
+                    if not users:
+                        continue
+
+                    given = await self._grant_rockets(users=users)
+                    await t.commit()
+            except Exception as e:
+                logger.error(
+                    event=f"Failed to give offline rockets after {after}: {e}",
+                    exception=traceback.format_exception(e),
+                )
+
+                if not users:
+                    break
+            else:
+                users_count += len(users)
+                rockets_count += sum(len(ids) for ids in given.values())
+                await self._queue_premium_rocket_notifications(users=users, telegram_ids=given[RocketTypeEnum.premium])
+
+            after = (users[-1].last_online, users[-1].id)
+
+        logger.info(
+            f"Offline rockets given: {rockets_count} rockets to {users_count} users "
+            f"in {time.monotonic() - started_at:.2f}s, stopped after {after}"
+        )
+
+    async def _grant_rockets(self, users: Sequence[Row]) -> dict[RocketTypeEnum, list[int]]:
+        created = await self.repo.create_missing_rockets(
+            telegram_ids=[user.telegram_id for user in users],
+            rockets=GRANTED_ROCKETS,
+        )
+
+        given = {rocket["type"]: [] for rocket in GRANTED_ROCKETS}
+        for user_id, rocket_type in created:
+            given[RocketTypeEnum(rocket_type)].append(user_id)
+
+        now = datetime.utcnow()
+        await self.repo.set_next_rocket_at(
+            given=given,
+            next_at={rocket["type"]: now + timedelta(minutes=rocket["timeout"]) for rocket in GRANTED_ROCKETS},
+        )
+        return given
+
+    async def _queue_premium_rocket_notifications(self, users: Sequence[Row], telegram_ids: list[int]) -> None:
+        if not telegram_ids:
+            return
+
+        languages = {user.telegram_id: user.tg_language_code for user in users}
+        notifications = [
+            json.dumps(dict(telegram_id=telegram_id, language_code=languages.get(telegram_id)))
+            for telegram_id in telegram_ids
+        ]
+
+        try:
+            await self.adapters.redis.redis.rpush(PREMIUM_ROCKET_NOTIFICATIONS_KEY, *notifications)
+        except Exception as e:
+            logger.error(f"Failed to queue premium rocket notifications: {e}. {telegram_ids=}")
+
+    async def send_premium_rocket_notifications(self) -> None:
+        redis = self.adapters.redis.redis
+        notifications = await redis.lpop(PREMIUM_ROCKET_NOTIFICATIONS_KEY, count=NOTIFICATIONS_BATCH_SIZE) or []
+
+        for notification in notifications:
+            data = json.loads(notification)
+            user = User(telegram_id=data["telegram_id"], tg_language_code=data["language_code"])
 
-        for user in users:
             try:
-                await self.grant_rocket(user)
+                await self.adapters.bot.send_menu(
+                    user=user,
+                    custom_text=self.adapters.i18n.t("task.premium_rocket_given", user.tg_language_code),
+                    custom_image="https://3rioteam.fra1.cdn.digitaloceanspaces.com/ret2.jpg",
+                )
             except Exception as e:
                 logger.error(
-                    event=f"Failed to give offline rocket to user {user.telegram_id}: {e}",
+                    event=f"Failed to send premium rocket notification to user {user.telegram_id}: {e}",
                     exception=traceback.format_exception(e),
                 )
 
-    async def _give_wheel(self, user: User) -> None:
+    async def _give_wheel(self, user: Row) -> None:
         async with self.repo.transaction() as t:
             await self.services.transaction.change_user_balance(
                 telegram_id=user.telegram_id,
@@ -264,9 +489,63 @@ class TaskService(BaseService):
             await t.commit()
 
     async def give_wheel(self) -> None:
+        started_at = time.monotonic()
+        after, users_count = None, 0
+
+        for telegram_ids in await self._active_chunks(window=WHEEL_TIMEOUT * 60):
+            if time.monotonic() - started_at >= TASK_TIME_BUDGET:
+                break
+
+            chunk_started_at = time.monotonic()
+
+            try:
+                async with self.repo.transaction() as t:
+                    given = await self.repo.give_wheels(
+                        after=after,
+                        limit=TASK_CHUNK_SIZE,
+                        next_wheel_at=datetime.utcnow() + timedelta(minutes=WHEEL_TIMEOUT),
+                        telegram_ids=telegram_ids,
+                    )
+                    await t.commit()
+            except Exception as e:
+                logger.error(
+                    event=f"Failed to give wheels after {after}, retrying the chunk one by one: {e}",
+                    exception=traceback.format_exception(e),
+                )
+                given = await self._give_wheel_one_by_one(after=after, telegram_ids=telegram_ids)
+
+            if given is None and telegram_ids is None:
+                break
+
+            if given is None:
+                continue
+
+            last_online, last_id, count = given
+
+            elapsed = time.monotonic() - chunk_started_at
+            logger.info(
+                f"Wheels given to {count} users after {after} in {elapsed:.2f}s "
+                f"({count / max(elapsed, 1e-3):.0f} users/s)"
+            )
+
+            after = (last_online, last_id)
+            users_count += count
+
+        elapsed = time.monotonic() - started_at
+        logger.info(f"Wheels given to {users_count} users in {elapsed:.2f}s, stopped after {after}")
+
+    async def _give_wheel_one_by_one(
+        self,
+        after: Cursor | None,
+        telegram_ids: list[int] | None,
+    ) -> tuple[datetime, int, int] | None:
         async with self.repo.transaction():
-            users = await self.repo.get_wheel_users()
+            users = await self.repo.get_wheel_users(after=after, limit=TASK_CHUNK_SIZE, telegram_ids=telegram_ids)
+
+        if not users:
+            return None
 
+        count = 0
         for user in users:
             try:
                 await self._give_wheel(user)
@@ -275,6 +554,10 @@ class TaskService(BaseService):
                     event=f"Failed to give wheel to user {user.telegram_id}: {e}",
                     exception=traceback.format_exception(e),
                 )
+            else:
+                count += 1
+
+        return users[-1].last_online, users[-1].id, count
 
     @staticmethod
     def _get_random_6_gifts(available_gifts: list[Gift]) -> list[Gift]:
@@ -297,25 +580,37 @@ class TaskService(BaseService):
 
         return random_6_gifts[0:random.randint(1, 6)]
 
+    async def invalidate_bets_config(self) -> None:
+        await self.adapters.bets_config.invalidate()
+        await self.adapters.response_cache.delete(key=BETS_CONFIG_RESPONSE_KEY)
+
     @BaseService.single_transaction
     async def populate_gifts_latest(self) -> None:
         blacklist_gifts = await self.repos.game.get_latest_gifts()
-        available_gifts = await self.repo.get_fake_available_gifts(blacklist=[gift.id for gift in blacklist_gifts])
+        # get_fake_available_gifts filters Gift.id, the feed rows are gifts_users: blacklist the gifts they point to
+        blacklist = [gift.gift_id for gift in blacklist_gifts]
+        available_gifts = await self.repo.get_fake_available_gifts(blacklist=blacklist)
         random_6_gifts = self._get_random_6_gifts(available_gifts)
+        gift_users = []
 
         for i, gift in enumerate(random_6_gifts):
             try:
-                await self.repos.game.create_gift_user(
-                    user_id=388953283,
-                    collection_id=gift.collection_id,
-                    gift_id=gift.id,
-                    roll_id=None,
-                    status=GiftUserStatusEnum.created,
-                    created_at=datetime.utcnow() + timedelta(seconds=i * random.randint(3, 10)),
-                )
+                async with self.session.begin_nested():
+                    gift_user = await self.repos.game.create_gift_user(
+                        user_id=388953283,
+                        collection_id=gift.collection_id,
+                        gift_id=gift.id,
+                        roll_id=None,
+                        status=GiftUserStatusEnum.created,
+                        created_at=datetime.utcnow() + timedelta(seconds=i * random.randint(3, 10)),
+                    )
             except IntegrityError as e:
                 await self.adapters.alerts.send_alert("populate_gifts_latest failed")
                 logger.error(
                     event=f"Failed to create gift user for gift {gift.id}",
                     exception=traceback.format_exception(e),
                 )
+            else:
+                gift_users.append((gift_user, gift))
+
+        self.services.game.push_latest_gifts(gift_users=gift_users)
@@ -1,10 +1,14 @@
+import base64
+import binascii
+from datetime import datetime
 from decimal import Decimal
-from typing import Annotated
+from typing import Annotated, Any
 
 import structlog
 from fastapi.params import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
 from starlette import status
 
 from app.adapters.base import Adapters
@@ -13,14 +17,31 @@ from app.api.dependencies.stubs import (
     dependency_session_factory,
     placeholder,
 )
+from app.api.dto.user.request import TransactionsRequest
+from app.api.dto.user.response import TransactionResponse, TransactionsResponse
 from app.api.exceptions import ClientError
-from app.db.models import CurrenciesEnum, TransactionStatusEnum, TransactionTypeEnum
+from app.db.models import CurrenciesEnum, Transaction, TransactionTypeEnum, User
+from app.db.repos.transaction import TransactionCursor
 from app.services.base.base import BaseService
-from app.services.dto.transaction import ChangeUserBalanceDTO
+from app.services.dto.auth import WebappData
+from app.services.dto.transaction import ChangeUserBalanceDTO, ChangeUserBalancesDTO
 
 logger = structlog.stdlib.get_logger()
 
 
+def _encode_cursor(transaction: Transaction) -> str:
+    cursor = f"{transaction.created_at.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> TransactionCursor:
+    try:
+        created_at, transaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ClientError(message="Invalid cursor")
+
+
 class TransactionService(BaseService):
     def __init__(
         self,
@@ -42,36 +63,75 @@ class TransactionService(BaseService):
         tx_kwargs: dict | None = None,
         user_kwargs: dict | None = None,
     ) -> ChangeUserBalanceDTO:
-        user = await self.repos.user.get_user_for_update(telegram_id=telegram_id)
+        resp = await self.change_user_balances(
+            telegram_id=telegram_id,
+            amounts=[(currency, amount)],
+            tx_type=tx_type,
+            tx_kwargs=tx_kwargs,
+            user_kwargs=user_kwargs,
+        )
 
-        balance_name = f"{currency.value}_balance"
-        balance_before = getattr(user, balance_name)
-        balance_after = balance_before + Decimal(amount)
+        return ChangeUserBalanceDTO(user=resp.user, transaction=resp.transactions[0])
 
+    async def change_user_balances(
+        self,
+        telegram_id: int,
+        amounts: list[tuple[CurrenciesEnum, float]],
+        tx_type: TransactionTypeEnum,
+        tx_kwargs: dict | None = None,
+        user_kwargs: dict | None = None,
+    ) -> ChangeUserBalancesDTO:
         if not tx_kwargs:
             tx_kwargs = dict()
 
         if not user_kwargs:
             user_kwargs = dict()
 
-        if balance_after < 0:
+        # one round trip while the users row is locked: conditional update + ledger insert
+        transactions = await self.repo.change_balances(
+            telegram_id=telegram_id,
+            # through str, a float amount is stored as written and not as its binary expansion
+            amounts=[(currency, Decimal(str(amount))) for currency, amount in amounts],
+            tx_type=tx_type,
+            tx_kwargs=tx_kwargs,
+            user_kwargs=user_kwargs,
+        )
+
+        if not transactions:
             raise ClientError(message="Not enough balance", status_code=status.HTTP_402_PAYMENT_REQUIRED)
 
-        user_kwargs[balance_name] = balance_after
+        balances = {f"{tx.balance_currency}_balance": tx.balance_after for tx in transactions}
+        logger.info(f"Updated user balances {balances=}, diff={amounts}")
+
+        user = self._sync_loaded_user(telegram_id=telegram_id, values={**balances, **user_kwargs})
+        if user is None:
+            # not loaded by the caller, read after the update so the balances are the new ones
+            user = await self.repos.user.get_user_by_telegram_id(telegram_id=telegram_id)
 
-        logger.info(f"Updating user balance {balance_name=} {balance_after=}, diff={amount}")
-        user = await self.repos.user.update_user(telegram_id=user.telegram_id, **user_kwargs)
+        return ChangeUserBalancesDTO(user=user, transactions=transactions)
 
-        tx = await self.repo.create_transaction(
-            user_id=telegram_id,
-            balance_before=balance_before,
-            balance_after=balance_after,
-            balance_amount=amount,
-            balance_currency=currency,
-            type=tx_type,
-            status=TransactionStatusEnum.success,
-            **tx_kwargs,
+    def _sync_loaded_user(self, telegram_id: int, values: dict[str, Any]) -> User | None:
+        # the update bypasses the ORM, so a user already loaded in this session gets the new values without a reload
+        for instance in self.session.identity_map.values():
+            if isinstance(instance, User) and instance.telegram_id == telegram_id:
+                for key, value in values.items():
+                    set_committed_value(instance, key, value)
+
+                return instance
+
+        return None
+
+    @BaseService.single_transaction
+    async def get_user_transactions(self, current_user: WebappData, data: TransactionsRequest) -> TransactionsResponse:
+        # one extra row tells whether there is a next page, without counting the history
+        transactions = await self.repo.get_user_transactions(
+            telegram_id=current_user.telegram_id,
+            limit=data.limit + 1,
+            before=_decode_cursor(cursor=data.cursor) if data.cursor else None,
         )
-        await self.session.refresh(user)
 
-        return ChangeUserBalanceDTO(user=user, transaction=tx)
+        page = transactions[:data.limit]
+        return TransactionsResponse(
+            items=[TransactionResponse.model_validate(transaction) for transaction in page],
+            next_cursor=_encode_cursor(transaction=page[-1]) if len(transactions) > data.limit else None,
+        )
@@ -1,5 +1,4 @@
 import traceback
-from datetime import datetime
 from typing import Annotated
 
 import structlog
@@ -88,9 +87,8 @@ class UserService(BaseService):
         await self.session.refresh(user)
         return user
 
-    @BaseService.single_transaction
-    async def get_or_create_user(self, data: WebappData) -> User:
-        user = await self.repo.get_user_by_telegram_id(telegram_id=data.telegram_id)
+    @staticmethod
+    def _profile(data: WebappData) -> dict:
         user_data = dict(
             tg_username=data.username,
             tg_first_name=data.first_name,
@@ -99,7 +97,6 @@ class UserService(BaseService):
             tg_language_code=data.language_code,
             tg_photo_url=data.photo_url,
             bot_banned=False,
-            last_online=datetime.utcnow(),
         )
 
         if data.country:
@@ -108,16 +105,58 @@ class UserService(BaseService):
         if data.broadcast_param:
             user_data["last_broadcast_key"] = data.broadcast_param
 
+        return user_data
+
+    def _is_stale(self, user: User, data: WebappData) -> bool:
+        """Whether get_or_create_user has something to write for this user"""
+
+        changed = any(getattr(user, key) != value for key, value in self._profile(data=data).items())
+        return changed or bool(self.services.task.due_rockets(user=user))
+
+    async def get_or_create_user(self, data: WebappData) -> User:
+        """
+        The user from its snapshot when the profile did not change and no rocket is due, from the database otherwise.
+        last_online goes to the presence set and is written to the users in bulk
+        """
+
+        await self.adapters.presence.touch(telegram_id=data.telegram_id)
+
+        user, version = await self.adapters.user_snapshots.get(telegram_id=data.telegram_id)
+        if user and not self._is_stale(user=user, data=data):
+            return user
+
+        user, written = await self._get_or_create_user(data=data)
+        if written:
+            # the commit bumped the version, so read it before the user again
+            version = await self.adapters.user_snapshots.version(telegram_id=data.telegram_id)
+            user = await self.get_user(telegram_id=data.telegram_id)
+
+        await self.adapters.user_snapshots.set(user=user, version=version)
+        return user
+
+    @BaseService.single_transaction
+    async def _get_or_create_user(self, data: WebappData) -> tuple[User, bool]:
+        user = await self.repo.get_user_by_telegram_id(telegram_id=data.telegram_id)
+
         if user:
+            if not self._is_stale(user=user, data=data):
+                return user, False
+
+            user_data = {
+                key: value for key, value in self._profile(data=data).items() if getattr(user, key) != value
+            }
+
             await self.services.task.grant_rocket(user=user)
-            user = await self.repo.update_user(telegram_id=user.telegram_id, **user_data)
+            if user_data:
+                await self.repo.update_user(telegram_id=user.telegram_id, **user_data)
+
             await self.session.commit()
-            await self.session.refresh(user)
-            return user
+            return user, True
 
+        user_data = self._profile(data=data)
         user_data["referral_from"] = data.referral
         user_data["promo"] = data.start_param
-        return await self._create_user(user_data=user_data, data=data)
+        return await self._create_user(user_data=user_data, data=data), True
 
     async def handle_referral(self, referral_from: int, data: WebappData) -> None:
         fuel_capacity = FUEL_CAPACITY_MAP.get(RocketTypeEnum.premium, 1)
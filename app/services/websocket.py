@@ -1,19 +1,117 @@
 import asyncio
+import os
+import traceback
+from collections import deque
+from typing import Awaitable, Callable, Iterator
 
 import structlog
+from prometheus_client import REGISTRY, Counter, Gauge
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
 from pydantic_core import from_json
+from redis.asyncio.client import PubSub
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from starlette.websockets import WebSocket, WebSocketState
+from starlette.websockets import WebSocket
 
 from app.adapters.base import Adapters
+from app.config.config import WebsocketConfig
 from app.services.base.base import BaseService
 from app.services.dto.websocket import WsEventsEnum, WSMessage
 
+# every worker listens on REDIS_CHANNEL, a user's messages go to the channel of that user only,
+# which is subscribed by the worker(s) holding that user's sockets
 REDIS_CHANNEL = "websockets"
+REDIS_USER_CHANNEL = "websockets:user:{telegram_id}"
+
+CONSUMER_RESTART_DELAY = 1
+CONSUMER_RESTART_DELAY_MAX = 30
 
 logger = structlog.stdlib.get_logger()
 
+WS_QUEUE_DEPTH = Gauge("websocket_send_queue_depth", "Messages waiting in websocket send queues of this worker")
+WS_DROPPED = Counter("websocket_messages_dropped_total", "Messages dropped from full websocket send queues")
+WS_SLOW_DISCONNECTS = Counter("websocket_slow_disconnects_total", "Websockets disconnected for being too slow")
+
+
+class WebsocketConnection:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        telegram_id: int,
+        config: WebsocketConfig,
+        on_close: Callable[["WebsocketConnection"], Awaitable[None]],
+    ):
+        self.websocket = websocket
+        self.telegram_id = telegram_id
+        self.closed = False
+
+        self._config = config
+        self._on_close = on_close
+        self._queue: deque[str] = deque()
+        self._ready = asyncio.Event()
+        self._drops = 0
+        self._writer: asyncio.Task | None = None
+        self._closing: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_forever())
+
+    def send(self, data: str) -> None:
+        if self.closed or self._closing is not None:
+            return
+
+        if len(self._queue) >= self._config.WS_SEND_QUEUE_SIZE:
+            # slow consumer: drop the oldest message, disconnect once it keeps falling behind
+            self._queue.popleft()
+            self._drops += 1
+            WS_QUEUE_DEPTH.dec()
+            WS_DROPPED.inc()
+
+            if self._drops > self._config.WS_MAX_DROPS:
+                logger.info(f"Disconnecting slow websocket. {self.telegram_id=}")
+                WS_SLOW_DISCONNECTS.inc()
+                self._closing = asyncio.create_task(self._on_close(self))
+                return
+
+        self._queue.append(data)
+        WS_QUEUE_DEPTH.inc()
+        self._ready.set()
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+
+        self.closed = True
+        WS_QUEUE_DEPTH.dec(len(self._queue))
+        self._queue.clear()
+
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+        try:
+            await self.websocket.close(code=1000, reason="Failed")
+        except Exception:  # noqa
+            pass
+
+    async def _write_forever(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+
+                while self._queue:
+                    data = self._queue.popleft()
+                    WS_QUEUE_DEPTH.dec()
+                    await asyncio.wait_for(self.websocket.send_text(data=data), timeout=self._config.WS_SEND_TIMEOUT)
+                    self._drops = 0
+
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Failed to send to websocket: {e=}. {self.telegram_id=}")
+            await self._on_close(self)
+
 
 class WebsocketService(BaseService):
     def __init__(self, adapters: Adapters, session_factory: sessionmaker, session: AsyncSession = None):
@@ -23,80 +121,184 @@ class WebsocketService(BaseService):
         self.adapters = adapters
         self.session_factory = session_factory
 
-        self._clients: dict[str, dict[int, WebSocket]] = {topic: {} for topic in WsEventsEnum}
+        self._config = adapters.config.websocket
+        self._clients: dict[str, dict[int, set[WebsocketConnection]]] = {topic: {} for topic in WsEventsEnum}
+        self._pubsub: PubSub | None = None
+        self._collector = _ConnectionsCollector(service=self)
+        self._collector_registered = False
 
     async def consume(self) -> None:
-        coroutine = self._consume_channel()
+        if not self._collector_registered:
+            REGISTRY.register(self._collector)
+            self._collector_registered = True
+
+        coroutine = self._supervise_consumer()
         asyncio.create_task(coroutine)
 
-    def _find_websocket(self, event: WsEventsEnum, telegram_id: int) -> WebSocket | None:
+    def connections_count(self) -> dict[str, int]:
+        return {
+            event.value: sum(len(connections) for connections in clients.values())
+            for event, clients in self._clients.items()
+        }
+
+    @staticmethod
+    def _user_channel(telegram_id: int) -> str:
+        return REDIS_USER_CHANNEL.format(telegram_id=telegram_id)
+
+    def _is_connected(self, telegram_id: int) -> bool:
+        return any(telegram_id in clients for clients in self._clients.values())
+
+    def _find_connections(self, event: WsEventsEnum, telegram_id: int) -> set[WebsocketConnection]:
         try:
             return self._clients[event][telegram_id]
         except KeyError:
-            logger.debug(f"Websocket {telegram_id} ({event}) not found. {self._clients=}")
-            return
+            logger.debug(f"Websocket {telegram_id} ({event}) not found")
+            return set()
 
-    async def _add_consumer(self, event: WsEventsEnum, telegram_id: int, websocket: WebSocket) -> None:
-        self._clients[event][telegram_id] = websocket
+    async def _add_consumer(self, event: WsEventsEnum, connection: WebsocketConnection) -> None:
+        subscribed = self._is_connected(telegram_id=connection.telegram_id)
+        self._clients[event].setdefault(connection.telegram_id, set()).add(connection)
+        connection.start()
 
-    async def _delete_consumer(self, event: WsEventsEnum, telegram_id: int) -> None:
-        try:
-            websocket = self._clients[event][telegram_id]
-        except KeyError:
-            return
+        if not subscribed and self._pubsub is not None:
+            await self._pubsub.subscribe(self._user_channel(telegram_id=connection.telegram_id))
 
-        try:
-            await websocket.close(code=1000, reason="Failed")
-        except Exception:  # noqa
-            pass
+    async def _delete_consumer(self, event: WsEventsEnum, connection: WebsocketConnection) -> None:
+        await connection.close()
+        telegram_id = connection.telegram_id
 
-        try:
-            del self._clients[event][telegram_id]
-        except KeyError:
+        connections = self._clients[event].get(telegram_id)
+        if not connections or connection not in connections:
             return
 
+        connections.discard(connection)
+        if not connections:
+            del self._clients[event][telegram_id]
+
+        if not self._is_connected(telegram_id=telegram_id) and self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self._user_channel(telegram_id=telegram_id))
+            except Exception as e:
+                logger.warning(f"Failed to unsubscribe websocket channel: {e}. {telegram_id=}")
+
+    async def _supervise_consumer(self) -> None:
+        delay = CONSUMER_RESTART_DELAY
+
+        while True:
+            started_at = asyncio.get_running_loop().time()
+
+            try:
+                await self._consume_channel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(
+                    event=f"Websocket consumer failed, restarting in {delay}s: {e}",
+                    exception=traceback.format_exception(e),
+                )
+            else:
+                logger.warning(f"Websocket consumer stopped, restarting in {delay}s")
+
+            if asyncio.get_running_loop().time() - started_at > CONSUMER_RESTART_DELAY_MAX:
+                delay = CONSUMER_RESTART_DELAY
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CONSUMER_RESTART_DELAY_MAX)
+
     async def _consume_channel(self) -> None:
         channel = self.adapters.redis.redis.pubsub(ignore_subscribe_messages=True)
-        await channel.subscribe(REDIS_CHANNEL)
-        logger.info("Websocket channel subscribed")
 
-        async for msg in channel.listen():
-            data = from_json(msg.get("data"))
-            logger.info(f"Got {data=}")
-            message = WSMessage(**data)
+        try:
+            user_channels = {
+                self._user_channel(telegram_id=telegram_id)
+                for clients in self._clients.values()
+                for telegram_id in clients
+            }
+            await channel.subscribe(REDIS_CHANNEL, *user_channels)
+            self._pubsub = channel
+            logger.info(f"Websocket channel subscribed, {len(user_channels)} users")
 
-            websocket = self._find_websocket(event=message.event, telegram_id=message.telegram_id)
+            async for msg in channel.listen():
+                try:
+                    await self._handle_message(data=from_json(msg.get("data")))
+                except Exception as e:
+                    logger.error(
+                        event=f"Failed to handle websocket message: {e}",
+                        exception=traceback.format_exception(e),
+                    )
+        finally:
+            self._pubsub = None
+            await channel.aclose()
 
-            if not websocket:
-                websocket = self._find_websocket(
-                    event=WsEventsEnum.user_notification,
-                    telegram_id=message.telegram_id,
-                )
+    async def _handle_message(self, data: dict) -> None:
+        logger.info(f"Got {data=}")
+        message = WSMessage(**data)
 
-            if not websocket:
-                logger.info(f"Websocket not found for {data=}. {self._clients=}")
-                continue
+        if message.event == WsEventsEnum.broadcast:
+            self._broadcast(data=message.model_dump_json())
+            return
 
-            logger.info(f"Websocket channel received: {data}")
+        connections = self._find_connections(event=message.event, telegram_id=message.telegram_id)
 
-            if websocket.state == WebSocketState.DISCONNECTED:
-                await self._delete_consumer(telegram_id=message.telegram_id, event=message.event)
-                return
+        if not connections:
+            connections = self._find_connections(
+                event=WsEventsEnum.user_notification,
+                telegram_id=message.telegram_id,
+            )
 
-            data = message.model_dump_json()
-            logger.info(f"Sending to websocket: {data}")
-            await websocket.send_text(data=data)
+        if not connections:
+            logger.info(f"Websocket not found for {data=}")
+            return
+
+        data = message.model_dump_json()
+        logger.info(f"Sending to websocket: {data}")
+
+        for connection in connections:
+            connection.send(data=data)
+
+    def _broadcast(self, data: str) -> None:
+        count = 0
+
+        for clients in self._clients.values():
+            for connections in clients.values():
+                for connection in connections:
+                    connection.send(data=data)
+                    count += 1
+
+        logger.info(f"Broadcast to {count} websockets")
 
     async def subscribe(self, websocket: WebSocket, telegram_id: int) -> None:
         event = WsEventsEnum.user_notification
-        await self._add_consumer(event=event, telegram_id=telegram_id, websocket=websocket)
 
+        async def on_close(connection: WebsocketConnection) -> None:
+            await self._delete_consumer(event=event, connection=connection)
+
+        connection = WebsocketConnection(
+            websocket=websocket,
+            telegram_id=telegram_id,
+            config=self._config,
+            on_close=on_close,
+        )
+        await self._add_consumer(event=event, connection=connection)
+
+        # half-open sockets are found by the protocol ping/pong of uvicorn (deploy-cryptorockets/gunicorn_config.py),
+        # an unanswered ping closes the socket and receive returns the disconnect
         try:
-            while True:
-                await websocket.receive()
+            while not connection.closed:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
         except Exception as e:
             logger.info(f"Failed to socket: {type(e)=}; {e=}. {telegram_id=}")
-            await self._delete_consumer(telegram_id=telegram_id, event=event)
+        finally:
+            await self._delete_consumer(event=event, connection=connection)
+
+    def _channel(self, message: WSMessage) -> str:
+        # broadcasts go through the shared channel every worker listens on and get fanned out locally
+        if message.event == WsEventsEnum.broadcast:
+            return REDIS_CHANNEL
+
+        return self._user_channel(telegram_id=message.telegram_id)
 
     @BaseService.log_exception
     async def publish(self, message: WSMessage) -> None:
@@ -104,4 +306,34 @@ class WebsocketService(BaseService):
 
         async with self.adapters.redis.redis.client():
             logger.info(f"Sending to websocket: {data}")
-            await self.adapters.redis.redis.publish(channel=REDIS_CHANNEL, message=data)
+            await self.adapters.redis.redis.publish(channel=self._channel(message=message), message=data)
+
+    @BaseService.log_exception
+    async def publish_many(self, messages: list[WSMessage]) -> None:
+        if not messages:
+            return
+
+        async with self.adapters.redis.redis.pipeline(transaction=False) as pipe:
+            for message in messages:
+                pipe.publish(channel=self._channel(message=message), message=message.model_dump_json())
+
+            logger.info(f"Sending {len(messages)} messages to websockets")
+            await pipe.execute()
+
+
+class _ConnectionsCollector(Collector):
+    def __init__(self, service: WebsocketService):
+        self.service = service
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        gauge = GaugeMetricFamily(
+            name="websocket_connections",
+            documentation="Live websocket connections by worker and event",
+            labels=["worker", "event"],
+        )
+
+        worker = str(os.getpid())
+        for event, value in self.service.connections_count().items():
+            gauge.add_metric(labels=[worker, event], value=value)
+
+        yield gauge
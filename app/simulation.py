@@ -0,0 +1,366 @@
+"""
+Monte-Carlo simulation of the reward economics, vectorized over users with NumPy.
+
+Mirrors GameService.get_balance_diff / _get_balance_diff / _old_random / new_random and the wheel in spin_wheel,
+so the time users need to reach MAX_BALANCE can be estimated before a change ships.
+NumPy is in the dev dependency group, not in the app's runtime ones (poetry install --with dev):
+
+    python -m app.simulation --users 1000000 --steps 100
+    python -m app.simulation --parity
+"""
+
+import argparse
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.api.dto.game.response import WHEEL_PRIZES
+from app.config.constants import MAX_BALANCE
+from app.db.models import CurrenciesEnum, RocketTypeEnum, WheelPrizeEnum
+
+CURRENCIES = (CurrenciesEnum.usdt, CurrenciesEnum.token, CurrenciesEnum.ton)
+REGULAR_CURRENCY_WEIGHTS = (20, 60, 20)  # _handle_regular_rocket
+BALANCE_CURRENCIES = (CurrenciesEnum.usdt, CurrenciesEnum.ton)
+BALANCE_PRIZES = (WheelPrizeEnum.usdt, WheelPrizeEnum.ton)
+ROCKET_PRIZES = (WheelPrizeEnum.default_rocket, WheelPrizeEnum.offline_rocket, WheelPrizeEnum.premium_rocket)
+
+JACKPOT_CHANCE = 0.015
+NEW_RANDOM_STEPS_TO_MAX = 1000
+NEW_RANDOM_TARGET_PROGRESS = 0.999
+NEW_RANDOM_STEEPNESS = 2
+OLD_RANDOM_BELOW = 20  # _get_balance_diff switches from _old_random to new_random at this balance
+
+
+def old_random(balance: np.ndarray, u: np.ndarray) -> np.ndarray:
+    progress = np.minimum(balance / MAX_BALANCE, 1.0)
+    min_reward = 0.01 + (1 - progress) * 0.1
+    max_reward = 0.05 + (1 - progress) * 0.3
+
+    reward = min_reward + (max_reward - min_reward) * u
+    return np.round(np.minimum(reward, 2), 2)
+
+
+def new_random(balance: np.ndarray, u: np.ndarray) -> np.ndarray:
+    decay_factor = (1 - NEW_RANDOM_TARGET_PROGRESS) ** (1 / NEW_RANDOM_STEPS_TO_MAX)
+
+    progress = balance / MAX_BALANCE
+    shaped_progress = 1 - (1 - progress) ** NEW_RANDOM_STEEPNESS
+
+    remaining = MAX_BALANCE * (1 - shaped_progress)
+    base_reward = remaining * (1 - decay_factor)
+
+    reward = base_reward * (0.8 + 0.4 * u)
+    reward = np.minimum(reward, MAX_BALANCE - balance - 1e-6)
+    return np.round(reward, 6)
+
+
+# (low, high) of the uniform draws of _get_balance_diff, the jackpot ones by the balance they apply below
+_POOR_RANGE = (8, 10)
+_SUPER_RANGE = (2.5, 5.0)
+_JACKPOT_RANGES = ((MAX_BALANCE - 20, 1.5, 3.0), (MAX_BALANCE - 10, 0.5, 1), (MAX_BALANCE - 5, 0.05, 0.1))
+
+
+def balance_diff(
+    balance: np.ndarray,
+    usdt_ton: np.ndarray,
+    is_super: np.ndarray,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Vectorized GameService.get_balance_diff for usdt/ton. The branches are mutually exclusive per user,
+    so one uniform draw is shared by all of them: the common old/new_random branches are computed for everyone,
+    the rare ones are written over them by index, lowest priority first
+    """
+
+    size = balance.shape
+    u = rng.random(size=size)
+    diff = np.where(balance < OLD_RANDOM_BELOW, old_random(balance=balance, u=u), new_random(balance=balance, u=u))
+
+    jackpot = np.flatnonzero(rng.random(size=size) < JACKPOT_CHANCE)
+    for below, low, high in reversed(_JACKPOT_RANGES):
+        idx = jackpot[balance[jackpot] < below]
+        diff[idx] = np.round(low + (high - low) * u[idx], 2)
+
+    for idx, (low, high) in (
+        (np.flatnonzero(is_super & (balance < MAX_BALANCE - 20)), _SUPER_RANGE),
+        (np.flatnonzero(usdt_ton < 1), _POOR_RANGE),
+    ):
+        diff[idx] = np.round(low + (high - low) * u[idx], 2)
+
+    for low, high in ((0.001, 0.01), (0.0001, 0.001)):
+        idx = np.flatnonzero(balance + diff >= MAX_BALANCE)
+        diff[idx] = rng.uniform(low, high, size=idx.size)
+
+    return diff
+
+
+def token_diff(size: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.integers(50, 300, size=size, endpoint=True).astype(np.float64)
+
+
+@dataclass
+class SimulationReport:
+    users: int
+    steps: int
+    seconds: float
+    payouts: dict[str, float]
+    final_percentiles: dict[str, dict[int, float]]
+    trajectory: dict[str, list[tuple[int, float]]]
+    time_to_cap: dict[str, dict[str, float]] = field(default_factory=dict)
+
+
+class Simulator:
+    """
+    Every step each user launches one rocket (type drawn from the given shares) and spins the wheel
+    ``spins_per_step`` times. Wheel spins are assumed to be available, rockets won on the wheel are only counted
+    """
+
+    PERCENTILES = (50, 90, 99)
+    TRAJECTORY_POINTS = 10
+
+    def __init__(
+        self,
+        *,
+        users: int,
+        steps: int,
+        premium_share: float = 0.1,
+        super_share: float = 0.0,
+        spins_per_step: int = 1,
+        cap_fraction: float = 0.99,
+        seed: int | None = None,
+    ):
+        self.users = users
+        self.steps = steps
+        self.spins_per_step = spins_per_step
+        self.cap = MAX_BALANCE * cap_fraction
+        self.rng = np.random.default_rng(seed)
+
+        # rockets: 0 regular, 1 premium, 2 super
+        self.rocket_cum = np.cumsum([1 - premium_share - super_share, premium_share, super_share])
+        self.currency_cum = np.cumsum(REGULAR_CURRENCY_WEIGHTS) / sum(REGULAR_CURRENCY_WEIGHTS)
+
+        self.prize_types = [prize.type for prize in WHEEL_PRIZES]
+        self.prize_codes = np.array([list(WheelPrizeEnum).index(prize_type) for prize_type in self.prize_types])
+        self.prize_amounts = np.array([prize.amount for prize in WHEEL_PRIZES], dtype=np.float64)
+
+        chances = np.array([prize.chance for prize in WHEEL_PRIZES], dtype=np.float64)
+        safe = np.array([prize_type not in BALANCE_PRIZES for prize_type in self.prize_types])
+        self.prize_cum = np.cumsum(chances) / chances.sum()
+        self.safe_cum = np.cumsum(np.where(safe, chances, 0)) / chances[safe].sum()
+
+        self.first_spin_prize = self._prize_index(WheelPrizeEnum.ton, 1)
+        self.third_spin_prize = self._prize_index(WheelPrizeEnum.usdt, 1)
+
+    def run(self) -> SimulationReport:
+        started = time.perf_counter()
+        n = self.users
+
+        balances = {currency: np.zeros(n) for currency in CURRENCIES}
+        payouts = {currency.value: 0.0 for currency in CURRENCIES}
+        payouts |= {prize.value: 0.0 for prize in (WheelPrizeEnum.wheel, *ROCKET_PRIZES)}
+        capped_at = {currency: np.full(n, -1) for currency in BALANCE_CURRENCIES}
+
+        trajectory = {f"{currency.value}_mean": [] for currency in BALANCE_CURRENCIES}
+        trajectory |= {f"{currency.value}_p{p}": [] for currency in BALANCE_CURRENCIES for p in self.PERCENTILES}
+        trajectory_steps = set(np.linspace(1, self.steps, self.TRAJECTORY_POINTS, dtype=int).tolist())
+
+        spin_count = 0
+        for step in range(1, self.steps + 1):
+            self._launch(balances=balances, payouts=payouts)
+
+            for _ in range(self.spins_per_step):
+                self._spin(balances=balances, payouts=payouts, spin_count=spin_count)
+                spin_count += 1
+
+            for currency, first in capped_at.items():
+                first[(first < 0) & (balances[currency] >= self.cap)] = step
+
+                if step in trajectory_steps:
+                    values = balances[currency]
+                    trajectory[f"{currency.value}_mean"].append((step, float(values.mean())))
+                    for p, value in zip(self.PERCENTILES, np.percentile(values, self.PERCENTILES), strict=True):
+                        trajectory[f"{currency.value}_p{p}"].append((step, float(value)))
+
+        return SimulationReport(
+            users=n,
+            steps=self.steps,
+            seconds=time.perf_counter() - started,
+            payouts=payouts,
+            final_percentiles={
+                currency.value: {
+                    p: float(value)
+                    for p, value in zip(self.PERCENTILES, np.percentile(values, self.PERCENTILES), strict=True)
+                }
+                for currency, values in balances.items()
+            },
+            trajectory=trajectory,
+            time_to_cap={currency.value: self._time_to_cap(first=first) for currency, first in capped_at.items()},
+        )
+
+    def _launch(self, balances: dict[CurrenciesEnum, np.ndarray], payouts: dict[str, float]) -> None:
+        n = self.users
+        rocket = self._categorical(cum=self.rocket_cum, size=n)
+        is_multi = rocket > 0
+        is_super = rocket == 2  # noqa: PLR2004
+
+        # regular rockets pay one currency, premium and super pay all three, diffs use the pre-launch balances
+        regular_currency = self._categorical(cum=self.currency_cum, size=n)
+        usdt_ton = balances[CurrenciesEnum.usdt] + balances[CurrenciesEnum.ton]
+
+        diffs = {}
+        for i, currency in enumerate(CURRENCIES):
+            paid = is_multi | (regular_currency == i)
+
+            if currency == CurrenciesEnum.token:
+                diff = token_diff(size=n, rng=self.rng)
+            else:
+                diff = balance_diff(balance=balances[currency], usdt_ton=usdt_ton, is_super=is_super, rng=self.rng)
+
+            diffs[currency] = np.where(paid, diff, 0)
+
+        for currency, diff in diffs.items():
+            balances[currency] += diff
+            payouts[currency.value] += float(diff.sum())
+
+    def _spin(self, balances: dict[CurrenciesEnum, np.ndarray], payouts: dict[str, float], spin_count: int) -> None:
+        n = self.users
+
+        if spin_count == 0 and self.first_spin_prize is not None:
+            prize = np.full(n, self.first_spin_prize)
+        elif spin_count == 2 and self.third_spin_prize is not None:  # noqa: PLR2004
+            prize = np.full(n, self.third_spin_prize)
+        else:
+            prize = np.searchsorted(self.prize_cum, self.rng.random(n), side="right")
+
+            # the "balance cap" fallback of spin_wheel
+            codes = self.prize_codes[prize]
+            for currency in BALANCE_CURRENCIES:
+                capped = (codes == self._code(WheelPrizeEnum[currency.value])) & (
+                    balances[currency] > MAX_BALANCE - 10
+                )
+                if capped.any():
+                    prize[capped] = np.searchsorted(self.safe_cum, self.rng.random(int(capped.sum())), side="right")
+
+        codes = self.prize_codes[prize]
+        amounts = self.prize_amounts[prize]
+
+        for prize_type in (*(WheelPrizeEnum[currency.value] for currency in CURRENCIES), WheelPrizeEnum.wheel):
+            won = np.where(codes == self._code(prize_type), amounts, 0)
+            payouts[prize_type.value] += float(won.sum())
+
+            if prize_type != WheelPrizeEnum.wheel:
+                balances[CurrenciesEnum[prize_type.value]] += won
+
+        for prize_type in ROCKET_PRIZES:
+            payouts[prize_type.value] += float(np.count_nonzero(codes == self._code(prize_type)))
+
+    def _categorical(self, cum: np.ndarray, size: int) -> np.ndarray:
+        # for a handful of categories, summing comparisons beats searchsorted
+        r = self.rng.random(size)
+        resp = np.zeros(size, dtype=np.int8)
+        for bound in cum[:-1]:
+            resp += r >= bound
+
+        return resp
+
+    @staticmethod
+    def _code(prize_type: WheelPrizeEnum) -> int:
+        return list(WheelPrizeEnum).index(prize_type)
+
+    @staticmethod
+    def _prize_index(prize_type: WheelPrizeEnum, amount: float) -> int | None:
+        for i, prize in enumerate(WHEEL_PRIZES):
+            if prize.type == prize_type and prize.amount == amount:
+                return i
+
+        return None
+
+    def _time_to_cap(self, first: np.ndarray) -> dict[str, float]:
+        reached = first[first > 0]
+        resp = {"reached": float(reached.size / first.size)}
+
+        for p in self.PERCENTILES:
+            resp[f"p{p}"] = float(np.percentile(reached, p)) if reached.size else float("nan")
+
+        return resp
+
+
+def check_parity(samples: int = 20_000, seed: int = 0, tolerance: float = 0.05) -> bool:
+    """
+    Compares balance_diff with the scalar GameService.get_balance_diff on a grid of balances.
+    The draws differ, so the check is on the mean reward per balance, within ``tolerance`` (relative)
+    """
+
+    from app.services.game import GameService  # noqa: PLC0415 (imports the whole app, only needed here)
+
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    service = GameService.__new__(GameService)
+    ok = True
+
+    for rocket_type in (RocketTypeEnum.default, RocketTypeEnum.super):
+        for balance in (0.5, 5, 15, 25, 35, 42, 46, 49, 49.9):
+            user = SimpleNamespace(usdt_balance=Decimal(str(balance)), ton_balance=Decimal(0))
+            scalar = np.array([
+                service.get_balance_diff(user=user, currency=CurrenciesEnum.usdt, rocket_type=rocket_type)
+                for _ in range(samples)
+            ])
+
+            vector = balance_diff(
+                balance=np.full(samples, balance),
+                usdt_ton=np.full(samples, balance),
+                is_super=np.full(samples, rocket_type == RocketTypeEnum.super),
+                rng=rng,
+            )
+
+            error = abs(vector.mean() - scalar.mean()) / max(scalar.mean(), 1e-9)
+            ok &= bool(error <= tolerance)
+            print(  # noqa: T201
+                f"{rocket_type.value:>8} balance={balance:<5} scalar={scalar.mean():.6f} "
+                f"vector={vector.mean():.6f} error={error:.2%}"
+            )
+
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reward economics Monte-Carlo")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--premium-share", type=float, default=0.1)
+    parser.add_argument("--super-share", type=float, default=0.0)
+    parser.add_argument("--spins-per-step", type=int, default=1)
+    parser.add_argument("--cap-fraction", type=float, default=0.99)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--parity", action="store_true", help="compare with the scalar implementation and exit")
+    args = parser.parse_args()
+
+    if args.parity:
+        sys.exit(0 if check_parity(seed=args.seed or 0) else 1)
+
+    report = Simulator(
+        users=args.users,
+        steps=args.steps,
+        premium_share=args.premium_share,
+        super_share=args.super_share,
+        spins_per_step=args.spins_per_step,
+        cap_fraction=args.cap_fraction,
+        seed=args.seed,
+    ).run()
+
+    print(f"{report.users} users x {report.steps} steps in {report.seconds:.2f}s")  # noqa: T201
+    print(f"payouts: {report.payouts}")  # noqa: T201
+    print(f"final balance percentiles: {report.final_percentiles}")  # noqa: T201
+    print(f"steps to {args.cap_fraction:.0%} of MAX_BALANCE: {report.time_to_cap}")  # noqa: T201
+
+    for name, values in report.trajectory.items():
+        print(f"{name:>10}: " + " ".join(f"{value:.3f}@{step}" for step, value in values))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
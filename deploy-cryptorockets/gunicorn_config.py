@@ -2,6 +2,11 @@ from multiprocessing import cpu_count
 
 from uvicorn.workers import UvicornWorker
 
+# uvicorn pings every websocket at the protocol level and closes the ones that do not pong in time,
+# browsers answer on their own, so half-open mobile sockets are dropped without any client code
+WS_PING_INTERVAL = 20
+WS_PING_TIMEOUT = 20
+
 
 class CustomUvicornWorker(UvicornWorker):
     CONFIG_KWARGS = {
@@ -10,6 +15,9 @@ class CustomUvicornWorker(UvicornWorker):
         "factory": True,
         "host": "0.0.0.0",  # noqa: S104
         "proxy_headers": True,
+        "ws": "websockets",
+        "ws_ping_interval": WS_PING_INTERVAL,
+        "ws_ping_timeout": WS_PING_TIMEOUT,
     }
 
 
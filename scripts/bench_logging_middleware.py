@@ -0,0 +1,104 @@
+"""
+Overhead of LoggingMiddleware on a trivial JSON POST route, driven straight through the ASGI app
+(no server, no network), so the numbers are the middleware cost alone:
+
+    python -m scripts.bench_logging_middleware
+    python -m scripts.bench_logging_middleware --requests 50000
+
+Compares the bare app, the app behind a pass-through BaseHTTPMiddleware (the floor the previous
+BaseHTTPMiddleware-based logging paid before doing any work) and the app behind LoggingMiddleware.
+Logs go to a logger that drops them, so formatting and output are not part of the measurement.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Callable
+
+import structlog
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message
+
+from app.adapters.base import Adapters
+from app.api.middlewares.logs import LoggingMiddleware
+from app.config.config import get_config
+
+BODY = b'{"amount": 1.5, "currency": "ton"}'
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/bench")
+    async def bench(data: dict) -> dict:
+        return data
+
+    return app
+
+
+def _variants(adapters: Adapters) -> dict[str, Callable[[], ASGIApp]]:
+    async def passthrough(request, call_next):  # noqa: ANN001, ANN202
+        return await call_next(request)
+
+    return {
+        "bare": _app,
+        "BaseHTTPMiddleware pass-through": lambda: BaseHTTPMiddleware(app=_app(), dispatch=passthrough),
+        "LoggingMiddleware": lambda: LoggingMiddleware(app=_app(), adapters=adapters),
+    }
+
+
+async def _call(app: ASGIApp) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/bench",
+        "raw_path": b"/bench",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(BODY)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": BODY, "more_body": False}
+
+    async def send(message: Message) -> None:
+        pass
+
+    await app(scope, receive, send)
+
+
+async def _measure(app: ASGIApp, requests: int) -> float:
+    for _ in range(min(requests // 10, 1000)):
+        await _call(app=app)
+
+    started_at = time.perf_counter()
+    for _ in range(requests):
+        await _call(app=app)
+
+    return requests / (time.perf_counter() - started_at)
+
+
+async def main(requests: int) -> None:
+    structlog.configure(logger_factory=structlog.ReturnLoggerFactory())
+    logging.disable(logging.CRITICAL)
+
+    adapters = Adapters(config=get_config())
+
+    for name, build in _variants(adapters=adapters).items():
+        rate = await _measure(app=build(), requests=requests)
+        print(f"{name:<34} {rate:>8.0f} req/s  {1e6 / rate:>6.1f} us/req")  # noqa: T201
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LoggingMiddleware overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    asyncio.run(main(requests=args.requests))
@@ -0,0 +1,101 @@
+"""
+Per-user cost of the /user/me payload, for users with 2, 5 and 10 rockets:
+
+    python -m scripts.bench_user_payload
+    python -m scripts.bench_user_payload --number 20000
+
+"validated" is what FastAPI does for a response_model route: validate the ORM user into UserResponse,
+dump it and render a JSONResponse. "user_payload" is what the routes return now: the dict built
+by user_payload rendered by ORJSONResponse. Both bodies are checked to decode to the same JSON first.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import warnings
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Awaitable, Callable
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.api.dto.user.response import UserResponse, user_payload
+from app.db.models import Rocket, RocketTypeEnum, User
+
+ROCKET_TYPES = (RocketTypeEnum.offline, RocketTypeEnum.premium, RocketTypeEnum.default)
+FIELD = create_model_field(name="response", type_=UserResponse, mode="serialization")
+
+
+def _user(rockets: int) -> User:
+    now = datetime.utcnow()
+    user = User(
+        id=1,
+        telegram_id=123456789,
+        ton_balance=Decimal("1.5"),
+        usdt_balance=Decimal("0.25"),
+        token_balance=Decimal(10),
+        wheel_balance=Decimal(3),
+        boost_balance=Decimal(2),
+        rich_ads_tasks=2,
+        rolls={"0.5": 2, "10.0": 1, "1200.0": 3},
+        next_wheel_at=now + timedelta(minutes=5),
+        next_wheel_ad_at=now - timedelta(minutes=1),
+        next_default_rocket_at=now + timedelta(hours=2),
+        next_offline_rocket_at=now - timedelta(hours=1),
+        next_premium_rocket_at=now + timedelta(hours=1),
+    )
+    user.rockets = [
+        Rocket(
+            id=i,
+            user_id=1,
+            type=ROCKET_TYPES[i % len(ROCKET_TYPES)],
+            fuel_capacity=5,
+            current_fuel=1,
+            enabled=True,
+            seen=bool(i % 2),
+        )
+        for i in range(rockets)
+    ]
+    return user
+
+
+async def _validated(user: User) -> bytes:
+    return JSONResponse(await serialize_response(field=FIELD, response_content=user, is_coroutine=True)).body
+
+
+async def _user_payload(user: User) -> bytes:
+    return ORJSONResponse(content=user_payload(user=user)).body
+
+
+async def _measure(render: Callable[[User], Awaitable[bytes]], user: User, number: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(number):
+        await render(user)
+
+    return (time.perf_counter() - started_at) / number
+
+
+async def main(number: int) -> None:
+    warnings.simplefilter("ignore")
+
+    for rockets in (2, 5, 10):
+        user = _user(rockets=rockets)
+        assert json.loads(await _validated(user)) == json.loads(await _user_payload(user)), "payloads differ"
+
+        before = await _measure(render=_validated, user=user, number=number)
+        after = await _measure(render=_user_payload, user=user, number=number)
+        print(  # noqa: T201
+            f"rockets={rockets:<3} validated {before * 1e6:>6.1f}us  "
+            f"user_payload {after * 1e6:>6.1f}us  ({before / after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/user/me payload cost")
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args()
+
+    asyncio.run(main(number=args.number))
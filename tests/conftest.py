@@ -0,0 +1,30 @@
+import os
+
+# the app reads its settings on import, the tests only need them to be valid, nothing is connected to
+TEST_ENV = dict(
+    AUTH_OPENAPI_USERNAME="test",
+    AUTH_OPENAPI_PASSWORD="test",
+    AUTH_TOKEN_TASK="test",
+    POSTGRES_HOST="localhost",
+    POSTGRES_USER="postgres",
+    POSTGRES_PASSWORD="postgres",
+    POSTGRES_DB="postgres",
+    POSTGRES_POOL_SIZE="1",
+    POSTGRES_MAX_OVERFLOW="0",
+    REDIS_HOST="localhost",
+    TELEGRAM_BOT_WEBAPP_URL="https://localhost",
+    TELEGRAM_BOT_WEBHOOK_HOST="https://localhost",
+    TELEGRAM_BOT_WEBHOOK_SECRET="test",
+    TELEGRAM_BOT_TOKEN="123456:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw",
+    ALERTS_ENABLED="false",
+    ALERTS_GRAFANA_URL="https://localhost",
+    ALERTS_GRAFANA_DATA_SOURCE="test",
+    ALERTS_CONTAINER_NAME="test",
+    ALERTS_TELEGRAM_BOT_TOKEN="123456:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw",
+    ALERTS_TELEGRAM_CHAT_ID="1",
+    SCANNER_WEBHOOK_URL="https://localhost",
+    SCANNER_WALLET="test",
+)
+
+for key, value in TEST_ENV.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,50 @@
+import html
+import re
+
+from app.adapters.alerts import HTML_TAG, AlertsAdapter
+from app.config.constants import TELEGRAM_MESSAGE_LIMIT
+
+
+def _balanced(text: str) -> bool:
+    opened = []
+    for match in HTML_TAG.finditer(text):
+        if not match.group(1):
+            opened.append(match.group(2))
+        elif not opened or opened.pop() != match.group(2):
+            return False
+
+    return not opened
+
+
+def test_short_messages_go_in_one_digest():
+    digests = AlertsAdapter._build_digests(messages=["<b>one</b>", "two"])
+
+    assert len(digests) == 1
+    assert digests[0].startswith("<b>one</b>")
+
+
+def test_long_message_is_split_on_lines_with_tags_reopened():
+    lines = "".join(f"<b>line {i}</b> {'x' * 80}\n" for i in range(200))
+    message = f"<pre>TRACEBACK\n{lines}</pre>\n<a href=\"https://grafana\">Grafana</a>"
+
+    digests = AlertsAdapter._build_digests(messages=[message])
+
+    assert len(digests) > 1
+    assert all(len(digest) <= TELEGRAM_MESSAGE_LIMIT for digest in digests)
+    assert all(_balanced(digest) for digest in digests)
+    assert all(digest.startswith("<pre>") for digest in digests)
+    # every line is kept whole, in order
+    assert re.findall(r"line (\d+)", "".join(digests)) == [str(i) for i in range(200)]
+
+
+def test_line_over_the_limit_is_escaped():
+    message = "<pre>" + "<i>&x</i>" * 2000 + "</pre>"
+
+    digests = AlertsAdapter._build_digests(messages=[message])
+
+    assert len(digests) > 1
+    assert all(len(digest) <= TELEGRAM_MESSAGE_LIMIT for digest in digests)
+    assert all(_balanced(digest) for digest in digests)
+    # no entity is cut in half
+    assert all(not re.search(r"&[a-z]*$", digest) for digest in digests)
+    assert "".join(AlertsAdapter._split(message=message)) == html.escape(message, quote=False)
@@ -0,0 +1,16 @@
+from app.simulation import Simulator, check_parity
+
+
+def test_balance_diff_matches_get_balance_diff():
+    # seeded on both sides, the mean reward per balance stays within 5% of the scalar implementation
+    assert check_parity(seed=0)
+
+
+def test_simulator_report():
+    report = Simulator(users=1000, steps=20, seed=0).run()
+
+    assert report.users == 1000
+    assert report.steps == 20
+    assert set(report.final_percentiles) == {"usdt", "token", "ton"}
+    assert all(len(values) == Simulator.TRAJECTORY_POINTS for values in report.trajectory.values())
+    assert report.payouts["token"] > 0
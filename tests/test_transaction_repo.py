@@ -0,0 +1,79 @@
+import asyncio
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy.dialects import postgresql
+
+from app.db.models import CurrenciesEnum, TransactionTypeEnum
+from app.db.repos.transaction import TransactionRepo, _balance_totals
+
+
+class _Captured(Exception):
+    pass
+
+
+class _Recorder:
+    def __init__(self):
+        self.info = {}
+        self.statement = None
+
+    async def execute(self, statement: Any, *_args: Any, **_kwargs: Any) -> None:
+        self.statement = statement
+        raise _Captured
+
+
+def _change_balances_sql(amounts: list[tuple[CurrenciesEnum, Decimal]]) -> str:
+    recorder = _Recorder()
+    repo = TransactionRepo(session=recorder)
+
+    try:
+        asyncio.run(
+            repo.change_balances(
+                telegram_id=1,
+                amounts=amounts,
+                tx_type=TransactionTypeEnum.wheel_spin,
+                tx_kwargs={},
+                user_kwargs={},
+            )
+        )
+    except _Captured:
+        pass
+
+    compiled = recorder.statement.compile(dialect=postgresql.dialect(), compile_kwargs=dict(literal_binds=True))
+    return str(compiled)
+
+
+def test_wheel_on_wheel_needs_a_wheel():
+    # a spin won as a wheel nets to 0, the debit still has to fit the balance
+    totals, floors = _balance_totals(amounts=[(CurrenciesEnum.wheel, Decimal(-1)), (CurrenciesEnum.wheel, Decimal(1))])
+
+    assert totals == {CurrenciesEnum.wheel: 0}
+    assert floors == {CurrenciesEnum.wheel: -1}
+
+
+def test_credit_first_covers_a_later_debit():
+    totals, floors = _balance_totals(amounts=[(CurrenciesEnum.ton, Decimal(2)), (CurrenciesEnum.ton, Decimal(-1))])
+
+    assert totals == {CurrenciesEnum.ton: 1}
+    assert floors == {CurrenciesEnum.ton: 0}
+
+
+def test_floors_are_per_currency():
+    totals, floors = _balance_totals(
+        amounts=[
+            (CurrenciesEnum.wheel, Decimal(-1)),
+            (CurrenciesEnum.ton, Decimal("0.5")),
+            (CurrenciesEnum.wheel, Decimal(3)),
+        ]
+    )
+
+    assert totals == {CurrenciesEnum.wheel: 2, CurrenciesEnum.ton: Decimal("0.5")}
+    assert floors == {CurrenciesEnum.wheel: -1, CurrenciesEnum.ton: 0}
+
+
+def test_zero_balance_wheel_on_wheel_is_guarded():
+    sql = _change_balances_sql(amounts=[(CurrenciesEnum.wheel, Decimal(-1)), (CurrenciesEnum.wheel, Decimal(1))])
+
+    # the update only matches a user that can pay the spin, with 0 wheels no row is updated and nothing is written
+    assert "users.wheel_balance + -1 >= 0" in sql
+    assert "users.wheel_balance + 0 >= 0" not in sql
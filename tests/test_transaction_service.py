@@ -0,0 +1,69 @@
+import asyncio
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any
+
+from app.db.models import CurrenciesEnum, Transaction, TransactionTypeEnum, User
+from app.services.transaction import TransactionService
+
+
+class _TransactionRepo:
+    def __init__(self):
+        self.amounts = None
+
+    async def change_balances(self, amounts: list[tuple[CurrenciesEnum, Decimal]], **_kwargs: Any) -> list:
+        self.amounts = amounts
+        return [
+            Transaction(id=i, balance_currency=currency.value, balance_after=Decimal(1))
+            for i, (currency, _) in enumerate(amounts)
+        ]
+
+
+class _UserRepo:
+    def __init__(self, user: User):
+        self.user = user
+
+    async def get_user_by_telegram_id(self, telegram_id: int) -> User:
+        assert telegram_id == self.user.telegram_id
+        return self.user
+
+
+def _service(user: User) -> TransactionService:
+    service = TransactionService.__new__(TransactionService)
+    service.session = SimpleNamespace(identity_map={})
+    service.repo = _TransactionRepo()
+    service.repos = SimpleNamespace(user=_UserRepo(user=user))
+    return service
+
+
+def test_float_amounts_are_stored_as_written():
+    service = _service(user=User(telegram_id=1))
+
+    asyncio.run(
+        service.change_user_balances(
+            telegram_id=1,
+            amounts=[(CurrenciesEnum.ton, 0.1), (CurrenciesEnum.usdt, Decimal("0.25")), (CurrenciesEnum.token, 50)],
+            tx_type=TransactionTypeEnum.wheel_spin,
+        )
+    )
+
+    assert service.repo.amounts == [
+        (CurrenciesEnum.ton, Decimal("0.1")),
+        (CurrenciesEnum.usdt, Decimal("0.25")),
+        (CurrenciesEnum.token, Decimal(50)),
+    ]
+
+
+def test_user_not_loaded_by_the_caller_is_read():
+    user = User(telegram_id=1)
+    service = _service(user=user)
+
+    resp = asyncio.run(
+        service.change_user_balances(
+            telegram_id=1,
+            amounts=[(CurrenciesEnum.wheel, -1)],
+            tx_type=TransactionTypeEnum.wheel_spin,
+        )
+    )
+
+    assert resp.user is user